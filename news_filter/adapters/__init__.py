@@ -1,8 +1,60 @@
-from . import inosmi_ru
-from .exceptions import ArticleNotFound
+"""Site adapters, one module per news site.
 
-__all__ = ['SANITIZERS', 'ArticleNotFound']
+An adapter module provides `sanitize(html, plaintext=False, parser=None)` and
+`ARTICLE_CONTAINER`, a (tag, class) pair of the element holding the article.
+Adapters are routed by the domain of the article URL and imported on first use,
+so parsers of unused sites are never loaded. Third-party adapters are
+registered through the `news_filter.adapters` entry point group, the entry
+point name is the domain and the value is the module path.
+"""
+from importlib import import_module
+from urllib.parse import urlsplit
 
-SANITIZERS = {
-    'inosmi_ru': inosmi_ru.sanitize,
+from .exceptions import AdapterNotFound, ArticleNotFound
+
+try:
+    from importlib.metadata import entry_points
+except ImportError:
+    entry_points = None
+
+__all__ = ['ADAPTERS', 'AdapterNotFound', 'ArticleNotFound', 'get_adapter', 'register_adapter']
+
+ENTRY_POINTS_GROUP = 'news_filter.adapters'
+
+ADAPTERS = {
+    'inosmi.ru': 'adapters.inosmi_ru',
 }
+
+_entry_points_loaded = False
+
+
+def register_adapter(domain, module_path):
+    ADAPTERS[domain] = module_path
+
+
+def _load_entry_points():
+    global _entry_points_loaded
+    _entry_points_loaded = True
+    if entry_points is None:
+        return
+    found = entry_points()
+    if hasattr(found, 'select'):
+        group = found.select(group=ENTRY_POINTS_GROUP)
+    else:
+        group = found.get(ENTRY_POINTS_GROUP, [])
+    for entry_point in group:
+        ADAPTERS.setdefault(entry_point.name, entry_point.value)
+
+
+def get_adapter(url):
+    """Return the adapter module for the site of the url, subdomains use the adapter of their domain."""
+    if not _entry_points_loaded:
+        _load_entry_points()
+
+    host = urlsplit(url).hostname or ''
+    labels = host.split('.')
+    for index in range(len(labels)):
+        module_path = ADAPTERS.get('.'.join(labels[index:]))
+        if module_path is not None:
+            return import_module(module_path)
+    raise AdapterNotFound(host)
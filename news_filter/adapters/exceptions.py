@@ -1,2 +1,7 @@
 class ArticleNotFound(Exception):
     pass
+
+
+class AdapterNotFound(ArticleNotFound):
+    """No adapter is registered for the site of the article."""
+    pass
@@ -1,3 +1,16 @@
+from html.parser import HTMLParser
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
 DEFAULT_BLACKLIST_TAGS = [
     'script',
     'time'
@@ -44,3 +57,142 @@ def remove_all_tags(soup):
     """Unwrap all tags."""
     for tag in soup.find_all(True):
         tag.unwrap()
+
+
+def get_available_parsers():
+    """Parsers for extract_plaintext, the fastest first."""
+    parsers = []
+    if LexborHTMLParser is not None:
+        parsers.append('selectolax')
+    if lxml is not None:
+        parsers.append('lxml')
+    return parsers
+
+
+def _has_class(element, classes):
+    element_classes = element.get('class')
+    if not element_classes:
+        return False
+    return any(name in classes for name in element_classes.split())
+
+
+def _collect_lxml_text(element, parts, buzz_classes, blacklist):
+    for child in element:
+        # Comments and processing instructions have a callable tag, only their tail is text
+        if isinstance(child.tag, str) and child.tag not in blacklist and not _has_class(child, buzz_classes):
+            if child.text:
+                parts.append(child.text)
+            _collect_lxml_text(child, parts, buzz_classes, blacklist)
+        if child.tail:
+            parts.append(child.tail)
+
+
+def _extract_plaintext_lxml(html, container_tag, container_class, buzz_classes, blacklist):
+    try:
+        root = lxml.html.fromstring(html)
+    except (lxml.etree.ParserError, ValueError):
+        # Raised for an empty page and for a str page starting with an XML encoding declaration
+        return None
+    containers = root.xpath(
+        f'//{container_tag}[contains(concat(" ", normalize-space(@class), " "), " {container_class} ")]'
+    )
+    if not containers:
+        return None
+    parts = []
+    article = containers[0]
+    if article.text:
+        parts.append(article.text)
+    _collect_lxml_text(article, parts, frozenset(buzz_classes), frozenset(blacklist))
+    return ''.join(parts)
+
+
+def _extract_plaintext_selectolax(html, container_tag, container_class, buzz_classes, blacklist):
+    article = LexborHTMLParser(html).css_first(f'{container_tag}.{container_class}')
+    if article is None:
+        return None
+    selectors = [f'.{name}' for name in buzz_classes] + list(blacklist)
+    for node in article.css(', '.join(selectors)):
+        node.decompose()
+    return article.text(deep=True, separator='')
+
+
+def extract_plaintext(
+        html,
+        parser,
+        container_tag,
+        container_class,
+        buzz_classes=(),
+        blacklist=DEFAULT_BLACKLIST_TAGS):
+    """Find the article container and collect its text without the buzz blocks in one pass.
+
+    Returns None when the container is not found.
+    """
+    if parser == 'lxml':
+        return _extract_plaintext_lxml(html, container_tag, container_class, buzz_classes, blacklist)
+    if parser == 'selectolax':
+        return _extract_plaintext_selectolax(html, container_tag, container_class, buzz_classes, blacklist)
+    raise ValueError(f'Unknown parser {parser}')
+
+
+class _StdlibContainerParser(HTMLParser):
+    def __init__(self, container_tag, container_class):
+        super().__init__(convert_charrefs=False)
+        self.container_tag = container_tag
+        self.container_class = container_class
+        self.depth = 0
+        self.closed = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag != self.container_tag or self.closed:
+            return
+        if self.depth:
+            self.depth += 1
+        elif self.container_class in (dict(attrs).get('class') or '').split():
+            self.depth = 1
+
+    def handle_endtag(self, tag):
+        if tag == self.container_tag and self.depth:
+            self.depth -= 1
+            self.closed = not self.depth
+
+
+class ContainerEndDetector:
+    """Incremental parser telling when the article container is closed.
+
+    Text is fed chunk by chunk while the page downloads, so the rest of the page
+    after the article does not need to be read. lxml is used when installed.
+    """
+
+    def __init__(self, container_tag, container_class):
+        self.container_tag = container_tag
+        self.container_class = container_class
+        self.closed = False
+        self._container = None
+        if lxml is not None:
+            self._parser = lxml.etree.HTMLPullParser(events=('start', 'end'), tag=container_tag)
+        else:
+            self._parser = _StdlibContainerParser(container_tag, container_class)
+
+    def feed(self, text):
+        """Feed the next piece of the page, return True once the container is closed."""
+        if self.closed:
+            return True
+        self._parser.feed(text)
+        if lxml is None:
+            self.closed = self._parser.closed
+            return self.closed
+
+        for event, element in self._parser.read_events():
+            if event == 'start' and self._container is None:
+                if self.container_class in (element.get('class') or '').split():
+                    self._container = element
+            elif event == 'end' and element is self._container:
+                self.closed = True
+                break
+            elif event == 'end':
+                # Only the end of the container matters, so finished elements are dropped
+                # and the tree does not grow to the whole page
+                element.clear(keep_tail=False)
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+        return self.closed
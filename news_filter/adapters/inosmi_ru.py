@@ -1,14 +1,48 @@
+import os
+
 from bs4 import BeautifulSoup
-import requests
-import pytest
 
 from .exceptions import ArticleNotFound
-from .html_tools import remove_buzz_attrs, remove_buzz_tags, remove_all_tags
-
+from .html_tools import (
+    DEFAULT_BLACKLIST_TAGS,
+    extract_plaintext,
+    get_available_parsers,
+    remove_buzz_attrs,
+    remove_buzz_tags,
+    remove_all_tags,
+)
+
+ARTICLE_CONTAINER = ('div', 'layout-article')
+BUZZ_CLASSES = [
+    'article__notice',
+    'article__aggr',
+    'media__copyright',
+    'article__meta',
+    'article__info',
+    'article__tags',
+]
+BUZZ_TAGS = ['aside']
+
+# 'html.parser' forces the BeautifulSoup sanitizer, by default the fastest installed parser is used
+DEFAULT_PARSER = os.getenv('SANITIZER_PARSER') or next(iter(get_available_parsers()), 'html.parser')
+
+
+def sanitize(html, plaintext=False, parser=None):
+    parser = parser or DEFAULT_PARSER
+    if plaintext and parser != 'html.parser':
+        text = extract_plaintext(
+            html,
+            parser,
+            *ARTICLE_CONTAINER,
+            buzz_classes=BUZZ_CLASSES,
+            blacklist=[*BUZZ_TAGS, *DEFAULT_BLACKLIST_TAGS],
+        )
+        if text is None:
+            raise ArticleNotFound()
+        return text.strip()
 
-def sanitize(html, plaintext=False):
     soup = BeautifulSoup(html, 'html.parser')
-    article = soup.select_one("div.layout-article")
+    article = soup.select_one('{}.{}'.format(*ARTICLE_CONTAINER))
 
     if not article:
         raise ArticleNotFound()
@@ -16,13 +50,8 @@ def sanitize(html, plaintext=False):
     article.attrs = {}
 
     buzz_blocks = [
-        *article.select('.article__notice'),
-        *article.select('.article__aggr'),
-        *article.select('aside'),
-        *article.select('.media__copyright'),
-        *article.select('.article__meta'),
-        *article.select('.article__info'),
-        *article.select('.article__tags'),
+        *article.select(', '.join(f'.{name}' for name in BUZZ_CLASSES)),
+        *article.select(', '.join(BUZZ_TAGS)),
     ]
     for el in buzz_blocks:
         el.decompose()
@@ -36,33 +65,3 @@ def sanitize(html, plaintext=False):
         remove_all_tags(article)
         text = article.get_text()
     return text.strip()
-
-
-def test_sanitize():
-    resp = requests.get('https://inosmi.ru/economic/20190629/245384784.html')
-    resp.raise_for_status()
-    clean_text = sanitize(resp.text)
-
-    assert 'В субботу, 29 июня, президент США Дональд Трамп' in clean_text
-    assert 'За несколько часов до встречи с Си' in clean_text
-
-    assert '<img src="' in clean_text
-    assert '<h1>' in clean_text
-
-    clean_plaintext = sanitize(resp.text, plaintext=True)
-
-    assert 'В субботу, 29 июня, президент США Дональд Трамп' in clean_plaintext
-    assert 'За несколько часов до встречи с Си' in clean_plaintext
-
-    assert '<img src="' not in clean_plaintext
-    assert '<a href="' not in clean_plaintext
-    assert '<h1>' not in clean_plaintext
-    assert '</article>' not in clean_plaintext
-    assert '<h1>' not in clean_plaintext
-
-
-def test_sanitize_wrong_url():
-    resp = requests.get('http://example.com')
-    resp.raise_for_status()
-    with pytest.raises(ArticleNotFound):
-        sanitize(resp.text)
@@ -0,0 +1,23 @@
+import sys
+
+import pytest
+
+from . import ADAPTERS, AdapterNotFound, get_adapter
+
+
+def test_get_adapter_by_domain():
+    assert get_adapter('https://inosmi.ru/economic/20190629/245384784.html').__name__ == 'adapters.inosmi_ru'
+    assert get_adapter('https://www.inosmi.ru/economic/').__name__ == 'adapters.inosmi_ru'
+
+
+def test_get_adapter_unknown_domain():
+    with pytest.raises(AdapterNotFound):
+        get_adapter('https://example.com/')
+
+
+def test_adapters_are_imported_lazily(monkeypatch):
+    monkeypatch.setitem(ADAPTERS, 'example.com', 'adapters.html_tools')
+    monkeypatch.delitem(sys.modules, 'adapters.html_tools', raising=False)
+
+    assert get_adapter('https://example.com/').__name__ == 'adapters.html_tools'
+    assert 'adapters.html_tools' in sys.modules
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+import requests
+
+from .exceptions import ArticleNotFound
+from .html_tools import get_available_parsers
+from .inosmi_ru import sanitize
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', 'fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return f.read()
+
+
+def test_sanitize():
+    resp = requests.get('https://inosmi.ru/economic/20190629/245384784.html')
+    resp.raise_for_status()
+    clean_text = sanitize(resp.text)
+
+    assert 'В субботу, 29 июня, президент США Дональд Трамп' in clean_text
+    assert 'За несколько часов до встречи с Си' in clean_text
+
+    assert '<img src="' in clean_text
+    assert '<h1>' in clean_text
+
+    clean_plaintext = sanitize(resp.text, plaintext=True)
+
+    assert 'В субботу, 29 июня, президент США Дональд Трамп' in clean_plaintext
+    assert 'За несколько часов до встречи с Си' in clean_plaintext
+
+    assert '<img src="' not in clean_plaintext
+    assert '<a href="' not in clean_plaintext
+    assert '<h1>' not in clean_plaintext
+    assert '</article>' not in clean_plaintext
+    assert '<h1>' not in clean_plaintext
+
+
+def test_sanitize_wrong_url():
+    resp = requests.get('http://example.com')
+    resp.raise_for_status()
+    with pytest.raises(ArticleNotFound):
+        sanitize(resp.text)
+
+
+@pytest.mark.parametrize('parser', ['html.parser', *get_available_parsers()])
+def test_sanitize_fixture(parser):
+    html = read_fixture('inosmi_ru_article.html')
+
+    clean_plaintext = sanitize(html, plaintext=True, parser=parser)
+
+    assert 'В субботу, 29 июня, президент США Дональд Трамп' in clean_plaintext
+    assert 'Мы вернулись на правильный путь' in clean_plaintext
+    assert 'Материалы ИноСМИ содержат' not in clean_plaintext
+    assert 'Читайте также' not in clean_plaintext
+    assert 'Susan Walsh' not in clean_plaintext
+    assert 'ria.analytics' not in clean_plaintext
+    assert '29.06.2019' not in clean_plaintext
+    assert 'Самое читаемое' not in clean_plaintext
+    assert clean_plaintext.split() == sanitize(html, plaintext=True, parser='html.parser').split()
+
+
+@pytest.mark.parametrize('parser', ['html.parser', *get_available_parsers()])
+@pytest.mark.parametrize('html', [
+    '<html><body><p>Not an article</p></body></html>',
+    '',
+    ' \n ',
+    '<?xml version="1.0" encoding="utf-8"?>\n<html><body><p>Not an article</p></body></html>',
+])
+def test_sanitize_fixture_without_article(parser, html):
+    with pytest.raises(ArticleNotFound):
+        sanitize(html, plaintext=True, parser=parser)
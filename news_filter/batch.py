@@ -0,0 +1,178 @@
+"""Batch scoring of big URL lists, e.g. the nightly re-scoring of archives.
+
+    python batch.py urls.txt --output results.jsonl
+
+URLs are read one per line from a file or from stdin (`-`). Results are
+appended to the output JSONL file as soon as they are ready. The output file
+doubles as a checkpoint: URLs already scored or found unparsable there are
+skipped, so an interrupted run continues where it stopped, and the ones that
+timed out, failed to be fetched or were too large are retried. A line cut
+off by a crash is dropped before new results are appended.
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+import json
+import os
+from urllib.parse import urlsplit
+
+import aiofiles
+
+from processor import CACHEABLE_STATUSES, analyze_article, format_article_result
+from resources import create_session, load_resources
+
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 50))
+BATCH_CONCURRENCY_PER_HOST = int(os.getenv("BATCH_CONCURRENCY_PER_HOST", 5))
+# Timeouts, fetch errors and too large pages may pass on the next run, so their URLs are analyzed again
+DONE_STATUSES = {status.value for status in CACHEABLE_STATUSES}
+
+
+async def read_urls(path):
+    if path == "-":
+        async for line in aiofiles.stdin:
+            yield line
+        return
+    async with aiofiles.open(path) as f:
+        async for line in f:
+            yield line
+
+
+async def read_checkpoint(path):
+    """Return URLs that already have a final result in the output file."""
+    done_urls = set()
+    if not os.path.exists(path):
+        return done_urls
+    async with aiofiles.open(path) as f:
+        async for line in f:
+            try:
+                article_result = json.loads(line)
+                if article_result["status"] in DONE_STATUSES:
+                    done_urls.add(article_result["url"])
+            except (ValueError, KeyError):
+                continue
+    return done_urls
+
+
+async def truncate_partial_line(path, block_size=4096):
+    """Cut off the last line of the output file if an interrupted run did not finish it."""
+    if not os.path.exists(path):
+        return
+    async with aiofiles.open(path, mode="rb+") as f:
+        position = await f.seek(0, os.SEEK_END)
+        if not position:
+            return
+        await f.seek(position - 1)
+        if await f.read(1) == b"\n":
+            return
+        while position:
+            block_start = max(position - block_size, 0)
+            await f.seek(block_start)
+            newline_position = (await f.read(position - block_start)).rfind(b"\n")
+            if newline_position != -1:
+                await f.truncate(block_start + newline_position + 1)
+                return
+            position = block_start
+        await f.truncate(0)
+
+
+async def iter_batch_results(
+        resources,
+        lines,
+        concurrency=BATCH_CONCURRENCY,
+        concurrency_per_host=BATCH_CONCURRENCY_PER_HOST,
+        skip_urls=frozenset(),
+        debug=False):
+    """Analyze URLs from an async iterable of lines, yield results as they finish.
+
+    At most `concurrency` articles are processed at once and at most
+    `concurrency_per_host` of them on one host. URLs are read lazily, so the
+    input may be arbitrarily long.
+    """
+    urls_queue = asyncio.Queue(maxsize=concurrency * 2)
+    results_queue = asyncio.Queue(maxsize=concurrency * 2)
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(concurrency_per_host))
+
+    async def produce_urls():
+        async for line in lines:
+            url = line.strip()
+            if url and url not in skip_urls:
+                await urls_queue.put(url)
+        for _ in range(concurrency):
+            await urls_queue.put(None)
+
+    async def analyze_urls():
+        while True:
+            url = await urls_queue.get()
+            if url is None:
+                await results_queue.put(None)
+                return
+            async with host_semaphores[urlsplit(url).hostname]:
+                article_result = await resources.in_flight.run(
+                    url, analyze_article, resources.session, resources, url,
+                )
+            await results_queue.put(article_result)
+
+    # The first error of the producer or of a worker, e.g. an unreadable input file.
+    # A failed task never sends its sentinels, so the results are awaited together with it.
+    failure = asyncio.get_running_loop().create_future()
+
+    def check_task(task):
+        if not task.cancelled() and task.exception() is not None and not failure.done():
+            failure.set_exception(task.exception())
+
+    async def get_result():
+        getter = asyncio.ensure_future(results_queue.get())
+        await asyncio.wait([getter, failure], return_when=asyncio.FIRST_COMPLETED)
+        if getter.done():
+            return getter.result()
+        getter.cancel()
+        return failure.result()
+
+    tasks = [asyncio.ensure_future(produce_urls())]
+    tasks.extend(asyncio.ensure_future(analyze_urls()) for _ in range(concurrency))
+    for task in tasks:
+        task.add_done_callback(check_task)
+    try:
+        finished_workers = 0
+        while finished_workers < concurrency:
+            article_result = await get_result()
+            if article_result is None:
+                finished_workers += 1
+                continue
+            yield format_article_result(article_result, debug)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def run_batch(input_path, output_path, concurrency, concurrency_per_host):
+    resources = load_resources()
+    resources.session = create_session()
+    try:
+        # New results would be glued to a line cut off by a crash
+        await truncate_partial_line(output_path)
+        done_urls = await read_checkpoint(output_path)
+        async with aiofiles.open(output_path, mode="a") as output:
+            async for article_result in iter_batch_results(
+                    resources,
+                    read_urls(input_path),
+                    concurrency=concurrency,
+                    concurrency_per_host=concurrency_per_host,
+                    skip_urls=done_urls):
+                await output.write(json.dumps(article_result, ensure_ascii=False) + "\n")
+                await output.flush()
+    finally:
+        await resources.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a big list of articles, one URL per line.")
+    parser.add_argument("input", type=str, help="File with URLs, `-` reads them from stdin.")
+    parser.add_argument("--output", type=str, required=True, help="JSONL file for results, also used as a checkpoint.")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Articles processed at once.")
+    parser.add_argument(
+        "--per-host", type=int, default=BATCH_CONCURRENCY_PER_HOST, help="Articles processed at once on one host.",
+    )
+    args = parser.parse_args()
+    asyncio.run(run_batch(args.input, args.output, args.concurrency, args.per_host))
@@ -0,0 +1,215 @@
+"""Offline throughput benchmark of the whole news_filter pipeline.
+
+Recorded article pages from the fixtures folder are served by a local aiohttp
+stub with configurable latency and failure injection. The benchmark drives
+`analyze_articles` directly and the HTTP server of news_filter at several
+concurrency levels, and prints articles/sec, latency percentiles and peak RSS
+as JSON. Run from the news_filter directory:
+
+    python -m benchmarks.pipeline --articles 200 --concurrency 1 10 50 --latency 0.05 --failure-rate 0.05
+"""
+import argparse
+import asyncio
+from collections import Counter
+import glob
+import json
+import os
+import random
+import statistics
+import time
+
+import aiohttp
+from aiohttp import web
+
+from adapters import register_adapter
+from limits import HostLimiter
+from processor import analyze_articles
+from resources import get_max_rss_mb, load_resources
+import server
+
+
+STUB_HOST = "127.0.0.1"
+URLS_PER_REQUEST = 10
+
+
+def create_stub_app(pages, latency, failure_rate, seed=0):
+    rng = random.Random(seed)
+
+    async def handle_article(request):
+        if latency:
+            # Exponential delays give the long tail real sites have
+            await asyncio.sleep(rng.expovariate(1 / latency))
+        if rng.random() < failure_rate:
+            raise web.HTTPServiceUnavailable()
+        page = pages[int(request.match_info["number"]) % len(pages)]
+        return web.Response(text=page, content_type="text/html")
+
+    app = web.Application()
+    app.add_routes([web.get("/articles/{number}.html", handle_article)])
+    return app
+
+
+def read_pages(fixtures_dir):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.html"))):
+        with open(path) as f:
+            pages.append(f.read())
+    return pages
+
+
+def tune_resources(resources, max_concurrency):
+    """Benchmark the analysis itself: no result cache, no dedup of the repeated pages, no politeness limits."""
+    resources.result_cache = None
+    resources.fingerprint_index = None
+    resources.fetch_limiter = HostLimiter(
+        rate=1_000_000,
+        burst=1_000_000,
+        initial_concurrency=max_concurrency,
+        max_concurrency=max_concurrency,
+        latency_target=60,
+    )
+
+
+def summarize(mode, concurrency, latencies, statuses, taken_time, articles_count, latency_per):
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "latency_per": latency_per,
+        "articles": articles_count,
+        "seconds": round(taken_time, 3),
+        "articles_per_sec": round(articles_count / taken_time, 1),
+        "latency_p50": round(percentiles[49], 4),
+        "latency_p95": round(percentiles[94], 4),
+        "latency_p99": round(percentiles[98], 4),
+        "statuses": dict(statuses),
+        "peak_rss_mb": round(get_max_rss_mb(), 1),
+    }
+
+
+async def run_concurrently(jobs, concurrency):
+    """Run job coroutine functions with at most `concurrency` at once, return their latencies and results."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    results = []
+
+    async def run_job(job):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await job()
+            latencies.append(time.perf_counter() - start)
+            results.append(result)
+
+    await asyncio.gather(*[run_job(job) for job in jobs])
+    return latencies, results
+
+
+def make_urls(base_url, run_id, articles_count):
+    # Unique query strings keep the in-flight deduplication out of the measurement
+    return [f"{base_url}/articles/{number}.html?run={run_id}" for number in range(articles_count)]
+
+
+async def bench_analyze_articles(resources, base_url, articles_count, concurrency):
+    urls = make_urls(base_url, f"direct-{concurrency}", articles_count)
+    jobs = [lambda url=url: analyze_articles(resources, [url]) for url in urls]
+
+    start = time.perf_counter()
+    latencies, results = await run_concurrently(jobs, concurrency)
+    taken_time = time.perf_counter() - start
+
+    statuses = Counter(article["status"] for result in results for article in result)
+    return summarize(
+        "analyze_articles", concurrency, latencies, statuses, taken_time, articles_count, latency_per="article",
+    )
+
+
+async def bench_http_server(session, server_url, base_url, articles_count, concurrency):
+    urls = make_urls(base_url, f"http-{concurrency}", articles_count)
+    requests_urls = [urls[index:index + URLS_PER_REQUEST] for index in range(0, len(urls), URLS_PER_REQUEST)]
+
+    async def request_articles(request_urls):
+        async with session.get(server_url, params={"urls": ",".join(request_urls)}) as response:
+            return await response.json()
+
+    jobs = [lambda request_urls=request_urls: request_articles(request_urls) for request_urls in requests_urls]
+
+    start = time.perf_counter()
+    latencies, results = await run_concurrently(jobs, concurrency)
+    taken_time = time.perf_counter() - start
+
+    statuses = Counter(article["status"] for result in results for article in result)
+    return summarize(
+        "http_server", concurrency, latencies, statuses, taken_time, articles_count,
+        latency_per=f"request of {URLS_PER_REQUEST} urls",
+    )
+
+
+async def start_site(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, STUB_HOST, 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://{STUB_HOST}:{port}"
+
+
+async def main(args):
+    pages = read_pages(args.fixtures)
+    max_concurrency = max(args.concurrency) * URLS_PER_REQUEST
+    register_adapter(STUB_HOST, "adapters.inosmi_ru")
+
+    stub_runner, base_url = await start_site(
+        create_stub_app(pages, args.latency, args.failure_rate)
+    )
+
+    results = []
+    try:
+        resources = load_resources(workers_count=args.workers)
+        tune_resources(resources, max_concurrency)
+        resources.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max_concurrency))
+        try:
+            for concurrency in args.concurrency:
+                results.append(await bench_analyze_articles(resources, base_url, args.articles, concurrency))
+        finally:
+            await resources.close()
+
+        app = server.create_app(workers_count=args.workers)
+
+        async def tune_app_resources(app):
+            tune_resources(app["resources"], max_concurrency)
+
+        app.on_startup.append(tune_app_resources)
+        app_runner, server_url = await start_site(app)
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as session:
+                for concurrency in args.concurrency:
+                    results.append(await bench_http_server(
+                        session, server_url, base_url, args.articles, concurrency,
+                    ))
+        finally:
+            await app_runner.cleanup()
+    finally:
+        await stub_runner.cleanup()
+
+    print(json.dumps({
+        "pages": len(pages),
+        "latency": args.latency,
+        "failure_rate": args.failure_rate,
+        "analysis_workers": args.workers,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline news_filter pipeline benchmark")
+    parser.add_argument("--fixtures", type=str, default="fixtures", help="Folder with recorded article pages.")
+    parser.add_argument("--articles", type=int, default=200, help="Articles analyzed at every concurrency level.")
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 10, 50],
+        help="Concurrency levels: articles for analyze_articles, HTTP requests of 10 urls for the server.",
+    )
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean response delay of the stub, seconds.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of stub responses failing with 503.")
+    parser.add_argument("--workers", type=int, default=0, help="Analysis worker processes, 0 analyzes on the loop.")
+    main_args = parser.parse_args()
+    asyncio.run(main(main_args))
@@ -0,0 +1,50 @@
+"""Compare pages/sec of the plaintext sanitizer with every installed parser.
+
+Run from the news_filter directory:
+
+    python -m benchmarks.sanitize --fixtures fixtures --repeat 200
+
+'html.parser' is the BeautifulSoup sanitizer, the others are the single-pass extractors.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+from adapters.html_tools import get_available_parsers
+from adapters.inosmi_ru import sanitize
+
+
+def measure(pages, parser, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            sanitize(html, plaintext=True, parser=parser)
+    taken_time = time.perf_counter() - start
+    return {
+        "parser": parser,
+        "seconds": round(taken_time, 3),
+        "pages_per_sec": round(len(pages) * repeat / taken_time, 1),
+    }
+
+
+def main(fixtures_dir, repeat):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.html"))):
+        with open(path) as f:
+            pages.append(f.read())
+
+    results = [
+        measure(pages, parser, repeat)
+        for parser in ["html.parser", *get_available_parsers()]
+    ]
+    print(json.dumps({"pages": len(pages), "repeat": repeat, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plaintext sanitizer throughput benchmark")
+    parser.add_argument("--fixtures", type=str, default="fixtures", help="Folder with saved article pages.")
+    parser.add_argument("--repeat", type=int, default=200, help="How many times every page is sanitized.")
+    args = parser.parse_args()
+    main(args.fixtures, args.repeat)
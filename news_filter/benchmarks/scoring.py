@@ -0,0 +1,89 @@
+"""Compare articles/sec of scoring with set lookups and with the lexicon scorer.
+
+Besides the negative and positive dictionaries, --lexicons adds random weighted
+lexicons drawn from them, to see how both ways scale with the number of
+lexicons. Run from the news_filter directory:
+
+    python -m benchmarks.scoring --articles 5000 --words 800 --lexicons 2 8
+"""
+import argparse
+import json
+import random
+import time
+
+from resources import NEGATIVE_WORDS_PATH, POSITIVE_WORDS_PATH
+from scoring import LexiconScorer, create_lexicon, read_charged_words
+from text_tools import calculate_jaundice_rate
+
+
+def generate_articles(dictionary, articles_count, words_count, seed=0):
+    rng = random.Random(seed)
+    # Mostly words out of the dictionaries, as in real articles
+    common_words = [f"слово{number}" for number in range(5000)]
+    return [
+        [rng.choice(dictionary) if rng.random() < 0.03 else rng.choice(common_words) for _ in range(words_count)]
+        for _ in range(articles_count)
+    ]
+
+
+def create_lexicons(dictionary, negative_words, positive_words, lexicons_count, seed=0):
+    rng = random.Random(seed)
+    lexicons = [create_lexicon("negative", negative_words), create_lexicon("positive", positive_words)]
+    for number in range(2, lexicons_count):
+        words = rng.sample(dictionary, len(dictionary) // 2)
+        lexicons.append(create_lexicon(f"random{number}", {word: rng.uniform(0.5, 2) for word in words}))
+    return lexicons[:lexicons_count]
+
+
+def measure(name, lexicons_count, score_articles, articles):
+    start = time.perf_counter()
+    score_articles(articles)
+    taken_time = time.perf_counter() - start
+    return {
+        "scorer": name,
+        "lexicons": lexicons_count,
+        "seconds": round(taken_time, 3),
+        "articles_per_sec": round(len(articles) / taken_time, 1),
+    }
+
+
+def main(articles_count, words_count, lexicons_counts):
+    negative_words = read_charged_words(NEGATIVE_WORDS_PATH)
+    positive_words = read_charged_words(POSITIVE_WORDS_PATH)
+    dictionary = sorted({*negative_words, *positive_words})
+    articles = generate_articles(dictionary, articles_count, words_count)
+
+    results = []
+    for lexicons_count in lexicons_counts:
+        lexicons = create_lexicons(dictionary, negative_words, positive_words, lexicons_count)
+        scorer = LexiconScorer(lexicons)
+        lexicon_sets = [frozenset(lexicon.weights) for lexicon in lexicons]
+
+        def score_with_sets(articles):
+            for words in articles:
+                for lexicon_set in lexicon_sets:
+                    calculate_jaundice_rate(words, lexicon_set)
+
+        def score_one_by_one(articles):
+            for words in articles:
+                scorer.score(words)
+
+        results.extend([
+            measure("sets", lexicons_count, score_with_sets, articles),
+            measure("lexicon_scorer", lexicons_count, score_one_by_one, articles),
+        ])
+
+    print(json.dumps({
+        "articles": articles_count,
+        "words_per_article": words_count,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scoring throughput benchmark")
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--words", type=int, default=800, help="Words in every article.")
+    parser.add_argument("--lexicons", type=int, nargs="+", default=[2, 8], help="Numbers of lexicons to score.")
+    args = parser.parse_args()
+    main(args.articles, args.words, args.lexicons)
@@ -0,0 +1,73 @@
+"""Compare words/sec of split_by_words with per-word and batched yielding.
+
+Run from the news_filter directory:
+
+    python -m benchmarks.split_by_words --words 200000 --chunk-size 500
+
+Without --corpus a reproducible corpus is generated from the word forms of the
+charged dictionaries, with Zipf-distributed repetitions like in real news text.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import pymorphy2
+
+from resources import NEGATIVE_WORDS_PATH, POSITIVE_WORDS_PATH, read_charged_words
+from text_tools import LemmaCache, split_by_words
+
+
+def generate_corpus(morph, words_count, seed=0):
+    dictionary = sorted({*read_charged_words(NEGATIVE_WORDS_PATH), *read_charged_words(POSITIVE_WORDS_PATH)})
+    word_forms = sorted({
+        form.word
+        for word in dictionary
+        for form in morph.parse(word)[0].lexeme
+    })
+    rng = random.Random(seed)
+    rng.shuffle(word_forms)
+    weights = [1 / rank for rank in range(1, len(word_forms) + 1)]
+    tokens = rng.choices(word_forms, weights=weights, k=words_count)
+    for index in range(0, words_count, 12):
+        tokens[index] = f"«{tokens[index].capitalize()},"
+    return " ".join(tokens)
+
+
+async def measure(morph, text, chunk_size, lemma_cache=None):
+    words_count = len(text.split())
+    start = time.perf_counter()
+    await split_by_words(morph, text, lemma_cache=lemma_cache, chunk_size=chunk_size)
+    taken_time = time.perf_counter() - start
+    return {
+        "chunk_size": chunk_size,
+        "lemma_cache": lemma_cache is not None,
+        "seconds": round(taken_time, 3),
+        "words_per_sec": round(words_count / taken_time),
+    }
+
+
+async def main(corpus_path, words_count, chunk_size):
+    morph = pymorphy2.MorphAnalyzer()
+    if corpus_path:
+        with open(corpus_path) as f:
+            text = f.read()
+    else:
+        text = generate_corpus(morph, words_count)
+
+    results = [
+        await measure(morph, text, chunk_size=1),
+        await measure(morph, text, chunk_size=chunk_size),
+        await measure(morph, text, chunk_size=chunk_size, lemma_cache=LemmaCache()),
+    ]
+    print(json.dumps({"words": len(text.split()), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="split_by_words throughput benchmark")
+    parser.add_argument("--corpus", type=str, default=None, help="Plain text file with a Russian corpus.")
+    parser.add_argument("--words", type=int, default=200_000, help="Size of the generated corpus.")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Words per batch in the batched mode.")
+    args = parser.parse_args()
+    asyncio.run(main(args.corpus, args.words, args.chunk_size))
@@ -5,3 +5,4 @@ class ProcessingStatus(Enum):
     FETCH_ERROR = "FETCH_ERROR"
     PARSING_ERROR = "PARSING_ERROR"
     TIMEOUT = "TIMEOUT"
+    TOO_LARGE = "TOO_LARGE"
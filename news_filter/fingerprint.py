@@ -0,0 +1,136 @@
+"""Content fingerprints of articles, to skip the analysis of republished texts.
+
+The exact fingerprint is a hash of the plaintext with case, punctuation and
+whitespace normalized away. SimHash of word shingles catches near-duplicates:
+the same text under another headline or with a different "read also" block
+differs only in a few bits of it.
+"""
+from collections import OrderedDict, defaultdict, namedtuple
+import hashlib
+import math
+import re
+
+
+SHINGLE_SIZE = 3
+SIMHASH_BITS = 64
+# Near-duplicates differ in at most that many SimHash bits
+MAX_DISTANCE = 3
+
+_WORD_RE = re.compile(r"\w+")
+
+Fingerprint = namedtuple("Fingerprint", ["digest", "simhash"])
+DedupMatch = namedtuple("DedupMatch", ["url", "result", "match"])
+
+
+def normalize_text(text):
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def _hash64(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+
+
+def get_simhash(words):
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[index:index + SHINGLE_SIZE]) for index in range(len(words) - SHINGLE_SIZE + 1)]
+    # Bits of every hash as a string, so that each column is counted by str.count in C
+    hashes = [format(_hash64(shingle), f"0{SIMHASH_BITS}b") for shingle in shingles]
+    threshold = len(hashes) / 2
+    simhash = 0
+    for column in zip(*hashes):
+        simhash = (simhash << 1) | (column.count("1") > threshold)
+    return simhash
+
+
+def get_fingerprint(text):
+    normalized_text = normalize_text(text)
+    digest = hashlib.blake2b(normalized_text.encode(), digest_size=16).hexdigest()
+    return Fingerprint(digest, get_simhash(normalized_text.split()))
+
+
+def get_distance(simhash, other_simhash):
+    return bin(simhash ^ other_simhash).count("1")
+
+
+class FingerprintIndex:
+    """LRU index of analyzed texts by their fingerprints.
+
+    SimHash is split into max_distance + 1 bands: two hashes that differ in at
+    most max_distance bits have at least one band in common, so only texts
+    sharing a band are compared.
+    """
+
+    def __init__(self, maxsize=10_000, max_distance=MAX_DISTANCE):
+        self.maxsize = maxsize
+        self.max_distance = max_distance
+        self._band_bits = math.ceil(SIMHASH_BITS / (max_distance + 1))
+        self._entries = OrderedDict()
+        self._bands = defaultdict(set)
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get_band_keys(self, simhash):
+        mask = (1 << self._band_bits) - 1
+        return [
+            (band, (simhash >> band * self._band_bits) & mask)
+            for band in range(self.max_distance + 1)
+        ]
+
+    def _find_near(self, fingerprint, exclude_url):
+        for band_key in self._get_band_keys(fingerprint.simhash):
+            for digest in self._bands.get(band_key, ()):
+                entry_fingerprint, url, result = self._entries[digest]
+                if url == exclude_url:
+                    continue
+                if get_distance(entry_fingerprint.simhash, fingerprint.simhash) <= self.max_distance:
+                    self._entries.move_to_end(digest)
+                    return DedupMatch(url, result, "near")
+        return None
+
+    def find(self, fingerprint, exclude_url=None):
+        """Return DedupMatch of an earlier analyzed same or nearly same text, None if there is none.
+
+        Texts analyzed under exclude_url are skipped, a page is not a republication of itself.
+        """
+        entry = self._entries.get(fingerprint.digest)
+        if entry is not None and entry[1] != exclude_url:
+            self.exact_hits += 1
+            self._entries.move_to_end(fingerprint.digest)
+            _, url, result = entry
+            return DedupMatch(url, result, "exact")
+
+        match = self._find_near(fingerprint, exclude_url)
+        if match is None:
+            self.misses += 1
+        else:
+            self.near_hits += 1
+        return match
+
+    def add(self, fingerprint, url, result):
+        if fingerprint.digest in self._entries:
+            self._entries.move_to_end(fingerprint.digest)
+            return
+        self._entries[fingerprint.digest] = (fingerprint, url, result)
+        for band_key in self._get_band_keys(fingerprint.simhash):
+            self._bands[band_key].add(fingerprint.digest)
+        if len(self._entries) > self.maxsize:
+            digest, (evicted_fingerprint, _, _) = self._entries.popitem(last=False)
+            for band_key in self._get_band_keys(evicted_fingerprint.simhash):
+                self._bands[band_key].discard(digest)
+                if not self._bands[band_key]:
+                    del self._bands[band_key]
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+        }
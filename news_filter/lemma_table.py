@@ -0,0 +1,223 @@
+"""Precompiled table word form -> lemma for a fast cold start of workers.
+
+The table is built offline from a corpus of article texts: the most frequent
+word forms together with every form of the charged words are lemmatized once
+and written to a compact binary file:
+
+    python lemma_table.py build corpus/*.txt --top 200000 --output lemmas.bin
+
+At runtime the file is memory-mapped read-only, so all processes that open it
+share the same pages of the OS page cache, and a word is looked up with a
+binary search over the sorted forms. MorphAnalyzer is only needed for the
+forms missing from the table.
+
+File layout, all integers are little-endian uint32, weights are float32:
+
+    header         magic, forms count, lemmas count, forms blob size, lemmas blob size
+    form offsets   forms count + 1 offsets into the forms blob, forms sorted by UTF-8 bytes
+    form lemmas    lemma id of every form
+    lemma offsets  lemmas count + 1 offsets into the lemmas blob
+    forms blob     UTF-8 forms, lowercased
+    lemmas blob    UTF-8 lemmas
+    lemma weights  weight of every lemma in the negative dictionary, then in the positive one, 0 out of it
+"""
+import argparse
+from collections import Counter
+from itertools import chain
+import mmap
+import os
+import struct
+
+import pymorphy2
+
+from scoring import create_lexicon, read_charged_words
+from text_tools import _clean_word
+
+
+MAGIC = b"LEMTAB02"
+HEADER = struct.Struct("<8sIIII")
+# Charged dictionaries in the order of their weights in the file
+NEGATIVE = 0
+POSITIVE = 1
+DICTIONARIES_COUNT = 2
+
+
+class LemmaTable:
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, forms_count, lemmas_count, forms_size, lemmas_size = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("Not a lemma table")
+        self.forms_count = forms_count
+        self.lemmas_count = lemmas_count
+
+        view = memoryview(buffer)
+        position = HEADER.size
+
+        def take(size):
+            nonlocal position
+            section = view[position:position + size]
+            position += size
+            return section
+
+        self._form_offsets = take((forms_count + 1) * 4).cast("I")
+        self._form_lemmas = take(forms_count * 4).cast("I")
+        self._lemma_offsets = take((lemmas_count + 1) * 4).cast("I")
+        # Forms and lemmas are sliced from the buffer itself: mmap slices are bytes, which compare and decode
+        self._forms_start = position
+        self._lemmas_start = position + forms_size
+        position += forms_size + lemmas_size
+        self._lemma_weights = take(DICTIONARIES_COUNT * lemmas_count * 4).cast("f")
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return self.forms_count
+
+    def _find_form(self, word):
+        key = word.encode()
+        buffer, start, offsets = self._buffer, self._forms_start, self._form_offsets
+        low, high = 0, self.forms_count
+        while low < high:
+            middle = (low + high) // 2
+            if buffer[start + offsets[middle]:start + offsets[middle + 1]] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.forms_count and buffer[start + offsets[low]:start + offsets[low + 1]] == key:
+            return low
+        return None
+
+    def get_lemma_id(self, word):
+        """Return the lemma id of a cleaned word form, None if the form is not in the table."""
+        index = self._find_form(word.lower())
+        if index is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._form_lemmas[index]
+
+    def get_lemma(self, lemma_id):
+        start = self._lemmas_start
+        return self._buffer[start + self._lemma_offsets[lemma_id]:start + self._lemma_offsets[lemma_id + 1]].decode()
+
+    def get_normal_form(self, word):
+        lemma_id = self.get_lemma_id(word)
+        if lemma_id is None:
+            return None
+        return self.get_lemma(lemma_id)
+
+    def read_charged_words(self, dictionary):
+        """Return lemma -> weight of the NEGATIVE or POSITIVE dictionary."""
+        weights = self._lemma_weights[dictionary * self.lemmas_count:(dictionary + 1) * self.lemmas_count]
+        return {
+            self.get_lemma(lemma_id): weight
+            for lemma_id, weight in enumerate(weights)
+            if weight
+        }
+
+    def stats(self):
+        return {
+            "forms": self.forms_count,
+            "lemmas": self.lemmas_count,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class LazyMorphAnalyzer:
+    """MorphAnalyzer that loads its dictionaries on the first word missing from the lemma table."""
+
+    def __init__(self):
+        self._morph = None
+
+    def parse(self, word):
+        if self._morph is None:
+            self._morph = pymorphy2.MorphAnalyzer()
+        return self._morph.parse(word)
+
+
+def count_word_forms(paths):
+    forms_counter = Counter()
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                forms_counter.update(_clean_word(token).lower() for token in line.split())
+    forms_counter.pop("", None)
+    return forms_counter
+
+
+def build_lemma_table(morph, word_forms, negative_words=(), positive_words=()):
+    """Serialize the table for the given word forms and charged dictionaries, return bytes.
+
+    Charged dictionaries are mappings lemma -> weight or plain lemmas weighing 1.
+    """
+    dictionaries = [create_lexicon("negative", negative_words), create_lexicon("positive", positive_words)]
+    charged_words = set(chain.from_iterable(lexicon.weights for lexicon in dictionaries))
+
+    # Every form of a charged word is kept, so charged words never miss the table
+    word_forms = set(word_forms)
+    for word in charged_words:
+        word_forms.add(word)
+        word_forms.update(form.word for form in morph.parse(word)[0].lexeme)
+
+    normal_forms = {form: morph.parse(form)[0].normal_form for form in word_forms}
+    lemmas = sorted(set(normal_forms.values()) | charged_words)
+    lemma_ids = {lemma: lemma_id for lemma_id, lemma in enumerate(lemmas)}
+    encoded_forms = sorted((form.encode(), lemma_ids[normal_form]) for form, normal_form in normal_forms.items())
+    encoded_lemmas = [lemma.encode() for lemma in lemmas]
+
+    def pack_offsets(blobs):
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        return struct.pack(f"<{len(offsets)}I", *offsets)
+
+    forms_blob = b"".join(form for form, _ in encoded_forms)
+    lemmas_blob = b"".join(encoded_lemmas)
+    return b"".join([
+        HEADER.pack(MAGIC, len(encoded_forms), len(lemmas), len(forms_blob), len(lemmas_blob)),
+        pack_offsets(form for form, _ in encoded_forms),
+        struct.pack(f"<{len(encoded_forms)}I", *(lemma_id for _, lemma_id in encoded_forms)),
+        pack_offsets(encoded_lemmas),
+        forms_blob,
+        lemmas_blob,
+        *(
+            struct.pack(f"<{len(lemmas)}f", *(lexicon.weights.get(lemma, 0.0) for lemma in lemmas))
+            for lexicon in dictionaries
+        ),
+    ])
+
+
+def build(corpus_paths, output_path, top, negative_words_path, positive_words_path):
+    morph = pymorphy2.MorphAnalyzer()
+    word_forms = [form for form, _ in count_word_forms(corpus_paths).most_common(top)]
+    table = build_lemma_table(
+        morph,
+        word_forms,
+        negative_words=read_charged_words(negative_words_path),
+        positive_words=read_charged_words(positive_words_path),
+    )
+    # Running workers have the old file mapped, it is replaced as a whole instead of being rewritten in place
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(table)
+    os.replace(temp_path, output_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lemma table for a fast cold start of news_filter workers.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the table from a corpus of plain text articles.")
+    build_parser.add_argument("corpus", nargs="+", help="Plain text files, one or many articles each.")
+    build_parser.add_argument("--output", required=True, help="Path of the table file.")
+    build_parser.add_argument("--top", type=int, default=200_000, help="Most frequent word forms to keep.")
+    build_parser.add_argument("--negative-words", default="charged_dict/negative_words.txt")
+    build_parser.add_argument("--positive-words", default="charged_dict/positive_words.txt")
+    args = parser.parse_args()
+    build(args.corpus, args.output, args.top, args.negative_words, args.positive_words)
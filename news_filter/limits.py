@@ -0,0 +1,158 @@
+"""Per-host throttling of article fetching.
+
+Every host gets a token bucket capping the request rate and an AIMD limiter
+that adapts the number of simultaneous requests: it grows by one per round
+of successful fast responses and is cut in half when latency or error rate
+goes over the target.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated_at = time.monotonic()
+        # Lock is fair, so waiters get tokens in FIFO order
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def stats(self):
+        self._refill()
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            "tokens": round(self.tokens, 2),
+        }
+
+
+class AdaptiveLimiter:
+    """Concurrency limit driven by additive increase / multiplicative decrease."""
+
+    def __init__(
+            self,
+            initial_limit=4,
+            min_limit=1,
+            max_limit=20,
+            latency_target=1.0,
+            max_error_rate=0.1,
+            smoothing=0.2):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.max_error_rate = max_error_rate
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self._decreased_at = 0.0
+        self._condition = asyncio.Condition()
+
+    async def _acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def _release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def record(self, latency, failed):
+        self.latency += self.smoothing * (latency - self.latency)
+        self.error_rate += self.smoothing * (float(failed) - self.error_rate)
+
+        overloaded = failed or self.latency > self.latency_target or self.error_rate > self.max_error_rate
+        now = time.monotonic()
+        if overloaded:
+            # Requests started before the previous decrease report the same congestion, skip them
+            if now - self._decreased_at > self.latency_target:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._decreased_at = now
+        else:
+            # One slot per round of `limit` successful requests
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    @asynccontextmanager
+    async def slot(self, is_failure):
+        await self._acquire()
+        start = time.monotonic()
+        failed = False
+        try:
+            yield
+        except Exception as exc:
+            failed = is_failure(exc)
+            raise
+        finally:
+            self.record(time.monotonic() - start, failed)
+            await self._release()
+
+    def stats(self):
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "latency": round(self.latency, 3),
+            "error_rate": round(self.error_rate, 3),
+        }
+
+
+def is_overload_error(exc):
+    """Errors telling that the host is overloaded or throttling us, not that the page is wrong."""
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status == 429 or exc.status >= 500
+    return isinstance(exc, (asyncio.TimeoutError, aiohttp.ClientError))
+
+
+class HostLimiter:
+    def __init__(self, rate, burst, initial_concurrency, max_concurrency, latency_target):
+        self.rate = rate
+        self.burst = burst
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self._buckets = {}
+        self._limiters = {}
+
+    def _get_host_limits(self, host):
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+            self._limiters[host] = AdaptiveLimiter(
+                initial_limit=min(self.initial_concurrency, self.max_concurrency),
+                max_limit=self.max_concurrency,
+                latency_target=self.latency_target,
+            )
+        return self._buckets[host], self._limiters[host]
+
+    @asynccontextmanager
+    async def throttle(self, url):
+        bucket, limiter = self._get_host_limits(urlsplit(url).hostname)
+        # The token is taken before the slot, so that waiting for it neither holds a slot
+        # nor counts as latency of the host
+        await bucket.acquire()
+        async with limiter.slot(is_overload_error):
+            yield
+
+    def stats(self):
+        return {
+            host: {**self._buckets[host].stats(), **self._limiters[host].stats()}
+            for host in self._buckets
+        }
@@ -0,0 +1,106 @@
+"""Minimal metrics in the Prometheus text exposition format."""
+from collections import defaultdict
+import math
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels)
+    return f"{{{pairs}}}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation):
+        super().__init__(name, documentation)
+        self._values = defaultdict(float)
+
+    def inc(self, value=1, **labels):
+        self._values[tuple(sorted(labels.items()))] += value
+
+    def get(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def _render_samples(self):
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """Gauge whose value is read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, get_value):
+        super().__init__(name, documentation)
+        self.get_value = get_value
+
+    def _render_samples(self):
+        yield f"{self.name} {_format_value(self.get_value())}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = (*sorted(buckets), math.inf)
+        self._counts = {}
+        self._sums = defaultdict(float)
+
+    def observe(self, value, **labels):
+        labels = tuple(sorted(labels.items()))
+        counts = self._counts.setdefault(labels, [0] * len(self.buckets))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        self._sums[labels] += value
+
+    def _render_samples(self):
+        for labels, counts in self._counts.items():
+            for bound, count in zip(self.buckets, counts):
+                bucket_labels = (*labels, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{_format_labels(bucket_labels)} {count}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(self._sums[labels])}"
+            yield f"{self.name}_count{_format_labels(labels)} {counts[-1]}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
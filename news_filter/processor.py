@@ -1,88 +1,305 @@
-import os
 import aiohttp
+import codecs
+from collections import namedtuple
+import os
+import re
+import sys
 import time
-import pymorphy2
-import aiofiles
 from anyio import create_task_group
 import asyncio
 from async_timeout import timeout
-from adapters import SANITIZERS, ArticleNotFound
-from text_tools import calculate_jaundice_rate, split_by_words
+from adapters import ArticleNotFound, get_adapter
+from adapters.html_tools import ContainerEndDetector
+from fingerprint import get_fingerprint
+from text_tools import split_by_words
 from enums import ProcessingStatus
+from result_cache import get_validation_headers
+import workers
 
 from contextlib import contextmanager
-from contextlib import asynccontextmanager
 import logging
 
+try:
+    import cchardet as chardet
+except ImportError:
+    try:
+        import charset_normalizer as chardet
+    except ImportError:
+        chardet = None
+
 
 logging.basicConfig(level=logging.DEBUG)
 
 
-sanitizer = SANITIZERS["inosmi_ru"]
+# How many words split_by_words lemmatizes before yielding to the event loop
+SPLIT_CHUNK_SIZE = int(os.getenv("SPLIT_CHUNK_SIZE", 500))
+# Pages bigger than that are not analyzed
+MAX_ARTICLE_BYTES = int(os.getenv("MAX_ARTICLE_BYTES", 2 * 1024 * 1024))
+FETCH_CHUNK_SIZE = 64 * 1024
+# Without a charset in Content-Type the encoding is detected from that many first bytes of the page
+ENCODING_SNIFF_BYTES = 64 * 1024
 
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+# Statuses that depend only on the page content and may be served from the result cache
+CACHEABLE_STATUSES = {ProcessingStatus.OK, ProcessingStatus.PARSING_ERROR}
+
+
+# peak_memory is the size of the page text and the raw chunk held at once while fetching, in bytes
+Page = namedtuple("Page", ["html", "etag", "last_modified", "peak_memory"], defaults=[None])
+
+
+class ArticleTooLarge(Exception):
+    pass
+
+
+def is_known_encoding(encoding):
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return False
+    return True
+
+
+def detect_encoding(head):
+    """Detect the encoding of a page from its first bytes: <meta> charset, then chardet, like response.text() does."""
+    match = _META_CHARSET_RE.search(head)
+    if match is not None and is_known_encoding(match.group(1).decode("ascii")):
+        return match.group(1).decode("ascii")
+    if chardet is not None and head:
+        encoding = chardet.detect(head)["encoding"]
+        if encoding and is_known_encoding(encoding):
+            return encoding
+    return "utf-8"
 
-async def fetch(session, url):
-    async with session.get(url) as response:
-        response.raise_for_status()
-        return await response.text()
 
+async def fetch(session, url, headers=None, max_bytes=MAX_ARTICLE_BYTES, container=None):
+    """Return the Page, or None when a conditional request is answered with 304 Not Modified.
 
-def get_charge_words_from_file():
-    with open("charged_dict/negative_words.txt") as f:
-        negative_words = [line.rstrip("\n") for line in f]
+    The body is decoded and parsed chunk by chunk, reading stops as soon as the
+    (tag, class) container of the article is closed. ArticleTooLarge is raised
+    once more than max_bytes are received.
+    """
+    async with session.get(url, headers=headers) as response:
+        response.raise_for_status()
+        if response.status == 304:
+            return None
+        if response.content_length is not None and response.content_length > max_bytes:
+            raise ArticleTooLarge()
 
-    with open("charged_dict/positive_words.txt") as f:
-        positive_words = [line.rstrip("\n") for line in f]
+        charset = response.charset if response.charset and is_known_encoding(response.charset) else None
+        decoder = None
+        detector = ContainerEndDetector(*container) if container else None
+        head = b""
+        parts = []
+        received = 0
+        peak_memory = 0
+        async for chunk in response.content.iter_chunked(FETCH_CHUNK_SIZE):
+            received += len(chunk)
+            if received > max_bytes:
+                raise ArticleTooLarge()
+            if decoder is None:
+                # Bytes are kept until there are enough of them to detect the encoding
+                head += chunk
+                if charset is None and len(head) < ENCODING_SNIFF_BYTES:
+                    continue
+                decoder = codecs.getincrementaldecoder(charset or detect_encoding(head))(errors="replace")
+                chunk, head = head, b""
+            text = decoder.decode(chunk)
+            parts.append(text)
+            peak_memory = max(peak_memory, sum(map(sys.getsizeof, parts)) + sys.getsizeof(chunk))
+            if detector is not None and detector.feed(text):
+                break
+        if decoder is None:
+            # The whole page is shorter than ENCODING_SNIFF_BYTES
+            decoder = codecs.getincrementaldecoder(charset or detect_encoding(head))(errors="replace")
+            parts.append(decoder.decode(head))
+        parts.append(decoder.decode(b"", final=True))
+        html = "".join(parts)
 
-    return (negative_words, positive_words)
+    # Decoded chunks and the joined page live together just before the chunks are dropped
+    peak_memory = max(peak_memory, sum(map(sys.getsizeof, parts)) + sys.getsizeof(html))
+    logging.debug(f"Fetched {received} bytes of {url}, peak memory for the page text {peak_memory} bytes")
+    return Page(html, response.headers.get("ETag"), response.headers.get("Last-Modified"), peak_memory)
 
 
-@asynccontextmanager
-async def timeit():
+@contextmanager
+def timeit(resources, timings, stage):
     start = time.monotonic()
     try:
         yield
     finally:
-        taken_time = "%.2f" % (time.monotonic() - start)
-        logging.info(f"Time taken to analize the text: {taken_time}")
+        record_stage_time(resources, timings, stage, time.monotonic() - start)
+
+
+def record_stage_time(resources, timings, stage, taken_time):
+    timings[stage] = round(taken_time, 4)
+    resources.stage_seconds.observe(taken_time, stage=stage)
+    logging.debug(f"Time taken to {stage} the article: {taken_time:.2f}")
+
+
+def record_stage_times(resources, timings, worker_timings):
+    for stage, taken_time in worker_timings.items():
+        record_stage_time(resources, timings, stage, taken_time)
+
+
+async def lemmatize(resources, timings, text):
+    if resources.executor is not None:
+        article_words, worker_timings = await asyncio.get_running_loop().run_in_executor(
+            resources.executor, workers.split, text,
+        )
+        record_stage_times(resources, timings, worker_timings)
+        return article_words
+    with timeit(resources, timings, "lemmatize"):
+        return await split_by_words(
+            resources.morph,
+            text,
+            lemma_cache=resources.lemma_cache,
+            chunk_size=SPLIT_CHUNK_SIZE,
+            lemma_table=resources.lemma_table,
+        )
+
 
+async def analyze_article(session, resources, url):
+    """Return the article result, per-stage timings are kept under the "timings" key."""
+    result_cache = resources.result_cache
+    cached = result_cache.get(url) if result_cache is not None else None
+    if cached is not None and result_cache.is_fresh(cached):
+        resources.articles_total.inc(status=cached.result["status"])
+        return cached.result
 
-async def process_article(session, morph, charged_words, url, result):
     score = None
+    positivity_score = None
     words_count = None
     status = None
     data_fetched = False
     cleaned_body = ""
+    page = None
+    timings = {}
     try:
-        async with timeout(3):
-            html = await fetch(session, url)
+        adapter = get_adapter(url)
+        # Waiting for the host limiter is not counted in the fetch timeout
+        async with resources.fetch_limiter.throttle(url):
+            with timeit(resources, timings, "fetch"):
+                async with timeout(3):
+                    page = await fetch(
+                        session,
+                        url,
+                        headers=get_validation_headers(cached),
+                        container=adapter.ARTICLE_CONTAINER,
+                    )
+        if page is None and cached is None:
+            # 304 Not Modified to a request that was not conditional, there is nothing to reuse
+            status = ProcessingStatus.FETCH_ERROR
+        elif page is None:
+            result_cache.refresh(url, cached)
+            resources.articles_total.inc(status=cached.result["status"])
+            return cached.result
+        else:
+            html = page.html
             data_fetched = True
+            if page.peak_memory is not None:
+                resources.page_memory_bytes.observe(page.peak_memory)
             status = ProcessingStatus.OK
-            cleaned_body = sanitizer(html, plaintext=True)
+            if resources.executor is None:
+                with timeit(resources, timings, "sanitize"):
+                    cleaned_body = adapter.sanitize(html, plaintext=True)
     except asyncio.TimeoutError:
         status = ProcessingStatus.TIMEOUT
     except ArticleNotFound:
         status = ProcessingStatus.PARSING_ERROR
-    except aiohttp.client_exceptions.ClientConnectorError:
+    except aiohttp.ClientError:
         status = ProcessingStatus.FETCH_ERROR
-    if data_fetched:
+    except ArticleTooLarge:
+        status = ProcessingStatus.TOO_LARGE
+    fingerprint = None
+    dedup = None
+    # A page whose article was not found is not fingerprinted, or all such pages would match each other
+    if data_fetched and status == ProcessingStatus.OK:
+        fingerprint_index = resources.fingerprint_index
         try:
-            async with timeit():
-                async with timeout(5):
-                    article_words = await split_by_words(morph, cleaned_body)
-                score = calculate_jaundice_rate(article_words, charged_words)
+            async with timeout(5):
+                if resources.executor is not None:
+                    # The worker keeps running after the timeout, only the result is dropped
+                    cleaned_body, fingerprint, worker_timings = await asyncio.get_running_loop().run_in_executor(
+                        resources.executor, workers.sanitize_and_fingerprint, url, html,
+                    )
+                    record_stage_times(resources, timings, worker_timings)
+                elif fingerprint_index is not None:
+                    with timeit(resources, timings, "fingerprint"):
+                        fingerprint = get_fingerprint(cleaned_body)
+                match = fingerprint_index.find(fingerprint, exclude_url=url) if fingerprint_index is not None else None
+                if match is None:
+                    article_words = await lemmatize(resources, timings, cleaned_body)
+            if match is None:
+                with timeit(resources, timings, "score"):
+                    scores = resources.scorer.score(article_words).rates
+                score = scores["negative"]
+                positivity_score = scores["positive"]
                 words_count = len(article_words)
+                if fingerprint_index is not None:
+                    fingerprint_index.add(fingerprint, url, {
+                        "score": score,
+                        "positivity_score": positivity_score,
+                        "words_count": words_count,
+                    })
+            else:
+                # Republished text, the scores of the earlier analyzed copy are reused
+                score = match.result["score"]
+                positivity_score = match.result["positivity_score"]
+                words_count = match.result["words_count"]
+                dedup = {"url": match.url, "match": match.match}
+                resources.dedup_total.inc(match=match.match)
         except asyncio.TimeoutError:
             status = ProcessingStatus.TIMEOUT
-    result.append({"url": url,"score": score, "words_count": words_count, "status": status.value})
+        except ArticleNotFound:
+            status = ProcessingStatus.PARSING_ERROR
+    article_result = {
+        "url": url,
+        "score": score,
+        "positivity_score": positivity_score,
+        "words_count": words_count,
+        "status": status.value,
+        "dedup": dedup,
+    }
+    resources.articles_total.inc(status=status.value)
+    if result_cache is not None and page is not None and status in CACHEABLE_STATUSES:
+        result_cache.set(url, article_result, etag=page.etag, last_modified=page.last_modified)
+    return {**article_result, "timings": timings}
 
 
-async def analyze_articles(urls):
+def format_article_result(article_result, debug=False):
+    if debug:
+        return article_result
+    return {key: value for key, value in article_result.items() if key != "timings"}
+
+
+async def process_article(session, resources, url, result, debug=False):
+    # Concurrent requests for the same URL share one analysis
+    article_result = await resources.in_flight.run(url, analyze_article, session, resources, url)
+    result.append(format_article_result(article_result, debug))
+
+
+async def analyze_articles(resources, urls, debug=False):
     result = []
-    async with aiohttp.ClientSession() as session:
-        morph = pymorphy2.MorphAnalyzer()
-        negative_charge_words, _ = get_charge_words_from_file()
-        async with create_task_group() as tg:
-            for url in urls:
-                tg.start_soon(process_article, session, morph, negative_charge_words, url, result)
+    async with create_task_group() as tg:
+        for url in urls:
+            tg.start_soon(process_article, resources.session, resources, url, result, debug)
     return result
+
+
+async def iter_analyzed_articles(resources, urls, debug=False):
+    """Yield article results in the order they are ready."""
+    tasks = [
+        asyncio.ensure_future(
+            resources.in_flight.run(url, analyze_article, resources.session, resources, url)
+        )
+        for url in urls
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield format_article_result(await next_done, debug)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,240 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import os
+import resource
+import time
+
+import aiohttp
+import pymorphy2
+
+from fingerprint import FingerprintIndex
+from lemma_table import NEGATIVE, POSITIVE, LazyMorphAnalyzer, LemmaTable
+from limits import HostLimiter
+from metrics import Counter, Gauge, Histogram, Registry
+from result_cache import MemoryResultCache, SqliteResultCache
+from single_flight import SingleFlight
+from scoring import LexiconScorer, create_lexicon, read_charged_words
+from text_tools import LemmaCache
+import workers
+
+
+NEGATIVE_WORDS_PATH = "charged_dict/negative_words.txt"
+POSITIVE_WORDS_PATH = "charged_dict/positive_words.txt"
+LEMMA_CACHE_SIZE = int(os.getenv("LEMMA_CACHE_SIZE", 100_000))
+# Table built by `python lemma_table.py build`, empty path lemmatizes every word with pymorphy2
+LEMMA_TABLE_PATH = os.getenv("LEMMA_TABLE_PATH", "")
+# 0 keeps lemmatization on the event loop
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", 0))
+# 0 disables the result cache
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 3600))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 10_000))
+# Empty path keeps results in memory only
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "")
+# 0 disables skipping the analysis of republished texts
+FINGERPRINT_INDEX_SIZE = int(os.getenv("FINGERPRINT_INDEX_SIZE", 10_000))
+HTTP_LIMIT = int(os.getenv("HTTP_LIMIT", 100))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", 20))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", 300))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 30))
+FETCH_RATE_PER_HOST = float(os.getenv("FETCH_RATE_PER_HOST", 10))
+FETCH_BURST_PER_HOST = int(os.getenv("FETCH_BURST_PER_HOST", 10))
+FETCH_CONCURRENCY_PER_HOST = int(os.getenv("FETCH_CONCURRENCY_PER_HOST", 4))
+FETCH_LATENCY_TARGET = float(os.getenv("FETCH_LATENCY_TARGET", 1.5))
+
+PAGE_MEMORY_BUCKETS = (64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024)
+
+
+Analyzer = namedtuple("Analyzer", ["morph", "negative_words", "positive_words", "lemma_table"])
+
+
+class Resources:
+    """Process-wide objects shared by every request.
+
+    MorphAnalyzer occupies 10-15 MB and takes a while to load, so it is built
+    once at server startup together with the charged dictionaries.
+    """
+
+    def __init__(
+        self,
+        morph,
+        negative_words,
+        positive_words,
+        lemma_cache=None,
+        executor=None,
+        result_cache=None,
+        session=None,
+        lemma_table=None,
+        fingerprint_index=None,
+    ):
+        self.morph = morph
+        self.negative_words = negative_words
+        self.positive_words = positive_words
+        self.scorer = LexiconScorer([
+            create_lexicon("negative", negative_words),
+            create_lexicon("positive", positive_words),
+        ])
+        self.lemma_cache = lemma_cache
+        self.lemma_table = lemma_table
+        self.executor = executor
+        self.result_cache = result_cache
+        self.session = session
+        self.fingerprint_index = fingerprint_index
+        self.in_flight = SingleFlight()
+        self.fetch_limiter = create_fetch_limiter()
+
+        self.metrics = Registry()
+        self.stage_seconds = self.metrics.register(Histogram(
+            "news_filter_stage_seconds", "Time spent in each stage of article processing.",
+        ))
+        self.articles_total = self.metrics.register(Counter(
+            "news_filter_articles_total", "Processed articles by status.",
+        ))
+        self.page_memory_bytes = self.metrics.register(Histogram(
+            "news_filter_page_memory_bytes", "Peak memory taken by the text of a page while it is fetched.",
+            buckets=PAGE_MEMORY_BUCKETS,
+        ))
+        self.dedup_total = self.metrics.register(Counter(
+            "news_filter_dedup_total", "Articles whose text was analyzed before under another URL or version.",
+        ))
+        self.metrics.register(Gauge(
+            "news_filter_articles_in_flight", "Articles being analyzed right now.",
+            lambda: len(self.in_flight),
+        ))
+        self.metrics.register(Gauge(
+            "news_filter_lemma_cache_size", "Word forms in the lemma cache of the server process.",
+            lambda: len(self.lemma_cache) if self.lemma_cache is not None else 0,
+        ))
+        self.metrics.register(Gauge(
+            "news_filter_result_cache_size", "Analyzed articles in the result cache.",
+            lambda: len(self.result_cache) if self.result_cache is not None else 0,
+        ))
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+        if self.result_cache is not None:
+            self.result_cache.close()
+
+    def stats(self):
+        return {
+            "lemma_cache": self.lemma_cache.stats() if self.lemma_cache is not None else None,
+            "lemma_table": self.lemma_table.stats() if self.lemma_table is not None else None,
+            "analysis_workers": self.executor._max_workers if self.executor is not None else 0,
+            "result_cache": self.result_cache.stats() if self.result_cache is not None else None,
+            "fingerprint_index": self.fingerprint_index.stats() if self.fingerprint_index is not None else None,
+            "in_flight": self.in_flight.stats(),
+            "fetch_limiter": self.fetch_limiter.stats(),
+            "http_pool": get_connector_stats(self.session.connector) if self.session is not None else None,
+        }
+
+
+def get_max_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def create_fetch_limiter():
+    return HostLimiter(
+        rate=FETCH_RATE_PER_HOST,
+        burst=FETCH_BURST_PER_HOST,
+        initial_concurrency=FETCH_CONCURRENCY_PER_HOST,
+        max_concurrency=HTTP_LIMIT_PER_HOST,
+        latency_target=FETCH_LATENCY_TARGET,
+    )
+
+
+def create_session():
+    """Build the HTTP session shared by all requests. Must be called with a running event loop."""
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_LIMIT,
+        limit_per_host=HTTP_LIMIT_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+def get_connector_stats(connector):
+    # aiohttp has no public API for the pool state, so it is read from the connector internals
+    idle_connections = getattr(connector, "_conns", {})
+    return {
+        "limit": connector.limit,
+        "limit_per_host": connector.limit_per_host,
+        "acquired": len(getattr(connector, "_acquired", ())),
+        "idle": sum(len(connections) for connections in idle_connections.values()),
+        "idle_hosts": len(idle_connections),
+    }
+
+
+def create_executor(workers_count):
+    if not workers_count:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=workers_count,
+        initializer=workers.init_worker,
+        initargs=(LEMMA_CACHE_SIZE, LEMMA_TABLE_PATH),
+    )
+
+
+def create_fingerprint_index():
+    if not FINGERPRINT_INDEX_SIZE:
+        return None
+    return FingerprintIndex(maxsize=FINGERPRINT_INDEX_SIZE)
+
+
+def create_result_cache():
+    if not RESULT_CACHE_TTL:
+        return None
+    if RESULT_CACHE_PATH:
+        return SqliteResultCache(RESULT_CACHE_TTL, RESULT_CACHE_PATH, maxsize=RESULT_CACHE_SIZE)
+    return MemoryResultCache(RESULT_CACHE_TTL, maxsize=RESULT_CACHE_SIZE)
+
+
+def load_analyzer():
+    """Load MorphAnalyzer, the lemma table and the charged dictionaries.
+
+    A multi-process server calls it once in the master, before forking, so
+    the workers share these pages.
+    """
+    start = time.monotonic()
+    rss_before = get_max_rss_mb()
+
+    lemma_table = None
+    if LEMMA_TABLE_PATH:
+        lemma_table = LemmaTable.open(LEMMA_TABLE_PATH)
+        # Words are looked up in the table first, pymorphy2 is loaded on the first miss
+        morph = LazyMorphAnalyzer()
+        negative_words = lemma_table.read_charged_words(NEGATIVE)
+        positive_words = lemma_table.read_charged_words(POSITIVE)
+    else:
+        morph = pymorphy2.MorphAnalyzer()
+        negative_words = read_charged_words(NEGATIVE_WORDS_PATH)
+        positive_words = read_charged_words(POSITIVE_WORDS_PATH)
+
+    taken_time = "%.2f" % (time.monotonic() - start)
+    memory_used = "%.1f" % (get_max_rss_mb() - rss_before)
+    logging.info(
+        f"Resources loaded in {taken_time}s, {memory_used} MB: "
+        f"{len(negative_words)} negative and {len(positive_words)} positive words"
+    )
+    return Analyzer(morph, negative_words, positive_words, lemma_table)
+
+
+def load_resources(workers_count=ANALYSIS_WORKERS, analyzer=None):
+    if analyzer is None:
+        analyzer = load_analyzer()
+    lemma_cache = LemmaCache(maxsize=LEMMA_CACHE_SIZE)
+    executor = create_executor(workers_count)
+    return Resources(
+        analyzer.morph,
+        analyzer.negative_words,
+        analyzer.positive_words,
+        lemma_cache=lemma_cache,
+        executor=executor,
+        result_cache=create_result_cache(),
+        lemma_table=analyzer.lemma_table,
+        fingerprint_index=create_fingerprint_index(),
+    )
@@ -0,0 +1,131 @@
+"""Cache of analysis results keyed by article URL.
+
+A fresh entry is returned as is. A stale one still keeps the ETag and
+Last-Modified of the analyzed page, so the processor can revalidate it with a
+conditional request and skip the analysis when the server answers 304.
+"""
+from collections import OrderedDict, namedtuple
+import json
+import sqlite3
+import time
+
+
+CacheEntry = namedtuple("CacheEntry", ["result", "etag", "last_modified", "stored_at"])
+
+
+class ResultCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def get(self, url):
+        entry = self._get(url)
+        if entry is None:
+            self.misses += 1
+        return entry
+
+    def is_fresh(self, entry):
+        fresh = time.time() - entry.stored_at < self.ttl
+        if fresh:
+            self.hits += 1
+        return fresh
+
+    def set(self, url, result, etag=None, last_modified=None):
+        self._set(url, CacheEntry(result, etag, last_modified, time.time()))
+
+    def refresh(self, url, entry):
+        """Prolong the entry after the server confirmed that the page did not change."""
+        self.revalidations += 1
+        self._set(url, entry._replace(stored_at=time.time()))
+
+    def stats(self):
+        return {
+            "size": len(self),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+        }
+
+    def close(self):
+        pass
+
+
+class MemoryResultCache(ResultCache):
+    def __init__(self, ttl, maxsize=10_000):
+        super().__init__(ttl)
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, url):
+        entry = self._entries.get(url)
+        if entry is not None:
+            self._entries.move_to_end(url)
+        return entry
+
+    def _set(self, url, entry):
+        self._entries[url] = entry
+        self._entries.move_to_end(url)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class SqliteResultCache(ResultCache):
+    """Keeps results between server restarts. Queries are short, so they run right on the event loop."""
+
+    def __init__(self, ttl, path, maxsize=10_000):
+        super().__init__(ttl)
+        self.maxsize = maxsize
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "url TEXT PRIMARY KEY, result TEXT, etag TEXT, last_modified TEXT, "
+            "stored_at REAL, used_at REAL)"
+        )
+        self._connection.commit()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _get(self, url):
+        row = self._connection.execute(
+            "SELECT result, etag, last_modified, stored_at FROM results WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        self._connection.execute("UPDATE results SET used_at = ? WHERE url = ?", (time.time(), url))
+        self._connection.commit()
+        result, etag, last_modified, stored_at = row
+        return CacheEntry(json.loads(result), etag, last_modified, stored_at)
+
+    def _set(self, url, entry):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+            (url, json.dumps(entry.result), entry.etag, entry.last_modified, entry.stored_at, time.time()),
+        )
+        self._connection.execute(
+            "DELETE FROM results WHERE url IN "
+            "(SELECT url FROM results ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+def get_validation_headers(entry):
+    if entry is None:
+        return None
+    headers = {}
+    if entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+    return headers or None
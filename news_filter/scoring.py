@@ -0,0 +1,64 @@
+"""Scoring of lemmatized articles against several weighted lexicons at once.
+
+Weights of a lemma in all lexicons are put into one tuple when the scorer is
+built. An article costs one dict lookup per word, whatever the number of
+lexicons, and only the weights of the few charged words are summed up.
+"""
+from collections import Counter, namedtuple
+from collections.abc import Mapping
+from itertools import chain
+
+
+Lexicon = namedtuple("Lexicon", ["name", "weights"])
+Score = namedtuple("Score", ["rates", "hits"])
+
+
+def create_lexicon(name, words):
+    """Build a lexicon from a mapping lemma -> weight or from plain lemmas weighing 1."""
+    if isinstance(words, Mapping):
+        return Lexicon(name, dict(words))
+    return Lexicon(name, dict.fromkeys(words, 1.0))
+
+
+def read_charged_words(path):
+    """Read lemma -> weight, one lemma per line optionally followed by a tab and its weight."""
+    weights = {}
+    with open(path) as f:
+        for line in f:
+            lemma, _, weight = line.partition("\t")
+            if lemma.strip():
+                weights[lemma.strip()] = float(weight) if weight.strip() else 1.0
+    return weights
+
+
+class LexiconScorer:
+    def __init__(self, lexicons):
+        self.names = [lexicon.name for lexicon in lexicons]
+        vocabulary = set(chain.from_iterable(lexicon.weights for lexicon in lexicons))
+        # Lemma -> its weight in every lexicon, words out of the lexicons are not in the dict
+        self.weights = {
+            lemma: tuple(lexicon.weights.get(lemma, 0.0) for lexicon in lexicons)
+            for lemma in vocabulary
+        }
+
+    def score(self, article_words, with_hits=False):
+        """Return Score with {lexicon name: weighted share of the lexicon words in percent}.
+
+        With with_hits=True the Score also has a Counter of the found words for every lexicon.
+        """
+        # map with a bound dict.get is the cheapest per-word step in Python, only the few hits are summed
+        found_weights = [weights for weights in map(self.weights.get, article_words) if weights is not None]
+        totals = [sum(column) for column in zip(*found_weights)] if found_weights else [0.0] * len(self.names)
+        words_count = len(article_words)
+        rates = {
+            name: round(total / words_count * 100, 2) if words_count else 0.0
+            for name, total in zip(self.names, totals)
+        }
+        hits = None
+        if with_hits:
+            hits = {name: Counter() for name in self.names}
+            for word in article_words:
+                for name, weight in zip(self.names, self.weights.get(word, ())):
+                    if weight:
+                        hits[name][word] += 1
+        return Score(rates, hits)
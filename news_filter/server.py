@@ -1,7 +1,64 @@
+import asyncio
+import json
+import os
+
 from aiohttp import web
 
 
-from processor import analize_articles
+from batch import iter_batch_results
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from processor import analyze_articles, iter_analyzed_articles
+from resources import ANALYSIS_WORKERS, create_session, load_resources
+import supervisor
+
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 8080))
+# More than 1 starts a pre-fork master with that many worker processes
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", 1))
+
+
+STREAM_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def get_stream_format(request):
+    """Pick the streaming format from `format` query param or Accept header, None means plain JSON."""
+    stream_format = request.rel_url.query.get("format")
+    if stream_format in STREAM_CONTENT_TYPES:
+        return stream_format
+    accept = request.headers.get("Accept", "")
+    for stream_format, content_type in STREAM_CONTENT_TYPES.items():
+        if content_type in accept:
+            return stream_format
+    return None
+
+
+def is_debug(request):
+    return request.rel_url.query.get("debug", "").lower() in ("1", "true", "yes")
+
+
+def format_stream_event(stream_format, data, event="article"):
+    payload = json.dumps(data, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {payload}\n\n".encode()
+    return f"{payload}\n".encode()
+
+
+async def stream_articles(request, urls, stream_format):
+    response = web.StreamResponse(headers={
+        "Content-Type": STREAM_CONTENT_TYPES[stream_format],
+        "Cache-Control": "no-cache",
+    })
+    await response.prepare(request)
+    async for article in iter_analyzed_articles(request.app["resources"], urls, debug=is_debug(request)):
+        await response.write(format_stream_event(stream_format, article))
+    if stream_format == "sse":
+        await response.write(format_stream_event(stream_format, {}, event="end"))
+    await response.write_eof()
+    return response
 
 
 async def handle(request):
@@ -19,14 +76,101 @@ async def handle(request):
             },
             status=400
         )
-    analized_articles = await analize_articles(urls)
+    stream_format = get_stream_format(request)
+    if stream_format:
+        return await stream_articles(request, urls, stream_format)
+    analized_articles = await analyze_articles(request.app["resources"], urls, debug=is_debug(request))
     return web.json_response(analized_articles)
 
 
-def main():
+async def iter_request_lines(request):
+    async for line in request.content:
+        yield line.decode()
+
+
+async def handle_batch(request):
+    """Score URLs from the request body, one per line, results are streamed back as NDJSON."""
+    response = web.StreamResponse(headers={
+        "Content-Type": STREAM_CONTENT_TYPES["ndjson"],
+        "Cache-Control": "no-cache",
+    })
+    await response.prepare(request)
+    async for article in iter_batch_results(
+            request.app["resources"],
+            iter_request_lines(request),
+            debug=is_debug(request)):
+        await response.write(format_stream_event("ndjson", article))
+    await response.write_eof()
+    return response
+
+
+async def handle_stats(request):
+    stats = request.app["resources"].stats()
+    stats_dir = request.app.get("stats_dir")
+    if stats_dir is None:
+        return web.json_response(stats)
+    supervisor.write_worker_stats(stats_dir, stats)
+    workers_stats = supervisor.read_workers_stats(stats_dir)
+    return web.json_response({
+        **stats,
+        "worker": os.getpid(),
+        "cluster": {
+            "workers": len(workers_stats),
+            "caches": supervisor.aggregate_cache_stats(workers_stats),
+        },
+    })
+
+
+async def handle_metrics(request):
+    return web.Response(
+        text=request.app["resources"].metrics.render(),
+        headers={"Content-Type": METRICS_CONTENT_TYPE},
+    )
+
+
+async def write_stats_periodically(app):
+    while True:
+        supervisor.write_worker_stats(app["stats_dir"], app["resources"].stats())
+        await asyncio.sleep(supervisor.STATS_INTERVAL)
+
+
+async def init_resources(app):
+    resources = load_resources(workers_count=app["workers_count"], analyzer=app["analyzer"])
+    resources.session = create_session()
+    app["resources"] = resources
+    if app["stats_dir"] is not None:
+        app["stats_writer"] = asyncio.ensure_future(write_stats_periodically(app))
+
+
+async def close_resources(app):
+    if app["stats_dir"] is not None:
+        app["stats_writer"].cancel()
+        supervisor.remove_worker_stats(app["stats_dir"], os.getpid())
+    await app["resources"].close()
+
+
+def create_app(analyzer=None, stats_dir=None, workers_count=ANALYSIS_WORKERS):
+    """Build the application, `analyzer` is preloaded by the master of a multi-process server."""
     app = web.Application()
-    app.add_routes([web.get('/', handle)])
-    web.run_app(app)
+    app["analyzer"] = analyzer
+    app["workers_count"] = workers_count
+    app["stats_dir"] = stats_dir
+    app.on_startup.append(init_resources)
+    app.on_cleanup.append(close_resources)
+    app.add_routes([
+        web.get('/', handle),
+        web.post('/batch', handle_batch),
+        web.get('/stats', handle_stats),
+        web.get('/metrics', handle_metrics),
+    ])
+    return app
+
+
+def main():
+    if SERVER_WORKERS > 1:
+        supervisor.serve(create_app, SERVER_HOST, SERVER_PORT, SERVER_WORKERS)
+    else:
+        web.run_app(create_app(), host=SERVER_HOST, port=SERVER_PORT)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,50 @@
+import asyncio
+
+
+class _Call:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs one task per key, concurrent callers with the same key await its result.
+
+    The shared task is cancelled only when every caller waiting for it was cancelled.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def run(self, key, coro_func, *args):
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(coro_func(*args)))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._forget(key, call))
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                # The cancelled task is finished only on its next step, a caller joining before that starts a new one
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,232 @@
+"""Pre-fork multi-process mode of the server.
+
+The master process binds the listening socket and loads the analyzer once,
+then forks the workers. They all accept connections from the inherited socket
+and share the analyzer pages until they write to them; `gc.freeze` keeps the
+garbage collector of the workers from touching those pages.
+
+Signals of the master:
+
+- SIGHUP reloads the analyzer, e.g. a rebuilt lemma table, and replaces the
+  workers one at a time: the old worker gets SIGTERM only after its
+  replacement reported that it is ready, so the socket is always served;
+- SIGTERM and SIGINT stop the workers gracefully and exit.
+
+A worker that dies is started again. New code is only picked up by a restart
+of the master.
+
+Every worker dumps its stats to a shared folder, so /stats of any worker can
+sum up the caches of all of them.
+"""
+import gc
+import json
+import logging
+import os
+import select
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
+from aiohttp import web
+
+from resources import load_analyzer
+
+
+READY_TIMEOUT = 120
+SUPERVISE_INTERVAL = 0.5
+STATS_INTERVAL = 1
+CACHE_STATS = ("lemma_cache", "lemma_table", "result_cache", "fingerprint_index")
+ADDITIVE_STATS = frozenset({"size", "hits", "misses", "evictions", "revalidations", "exact_hits", "near_hits"})
+
+
+def create_socket(host, port, backlog=128):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def get_stats_path(stats_dir, pid):
+    return os.path.join(stats_dir, f"{pid}.json")
+
+
+def write_worker_stats(stats_dir, stats):
+    path = get_stats_path(stats_dir, os.getpid())
+    # Readers never see a half-written file
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(stats, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_workers_stats(stats_dir):
+    workers_stats = {}
+    for name in os.listdir(stats_dir):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(stats_dir, name)) as f:
+                workers_stats[int(name[:-len(".json")])] = json.load(f)
+        except (OSError, ValueError):
+            # The worker has just exited
+            continue
+    return workers_stats
+
+
+def aggregate_cache_stats(workers_stats):
+    """Sum up counters of the caches over workers, settings are taken from any of them."""
+    totals = {}
+    for stats in workers_stats.values():
+        for name in CACHE_STATS:
+            cache_stats = stats.get(name)
+            if cache_stats is None:
+                continue
+            if name not in totals:
+                totals[name] = dict(cache_stats)
+                continue
+            for key in ADDITIVE_STATS & cache_stats.keys():
+                totals[name][key] += cache_stats[key]
+    return totals
+
+
+def remove_worker_stats(stats_dir, pid):
+    try:
+        os.remove(get_stats_path(stats_dir, pid))
+    except FileNotFoundError:
+        pass
+
+
+def run_worker(create_app, sock, analyzer, stats_dir, ready_fd):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # A rolling restart is driven by the master only
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    async def report_ready(app):
+        os.write(ready_fd, b"1")
+        os.close(ready_fd)
+
+    app = create_app(analyzer=analyzer, stats_dir=stats_dir)
+    app.on_startup.append(report_ready)
+    # run_app stops gracefully on SIGTERM: it closes the site and waits for the requests being served
+    web.run_app(app, sock=sock, print=None)
+
+
+class Master:
+    def __init__(self, create_app, host, port, workers_count):
+        self.create_app = create_app
+        self.workers_count = workers_count
+        self.sock = create_socket(host, port)
+        self.stats_dir = tempfile.mkdtemp(prefix="news_filter_stats_")
+        self.analyzer = None
+        self.workers = set()
+        self.stopping = False
+        self.reload_requested = False
+
+    def load_analyzer(self):
+        # The previous analyzer was frozen with everything else, it is only collected once unfrozen
+        self.analyzer = None
+        gc.unfreeze()
+        gc.collect()
+        self.analyzer = load_analyzer()
+        # Objects loaded so far are never collected, so the workers do not dirty their pages
+        gc.freeze()
+
+    def spawn_worker(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            exit_code = 0
+            try:
+                run_worker(self.create_app, self.sock, self.analyzer, self.stats_dir, write_fd)
+            except BaseException:
+                logging.exception("Worker failed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        os.close(write_fd)
+        return pid, read_fd
+
+    def start_worker(self):
+        """Fork a worker and wait until it is ready to serve, return its pid or None."""
+        pid, read_fd = self.spawn_worker()
+        try:
+            readable, _, _ = select.select([read_fd], [], [], READY_TIMEOUT)
+            is_ready = bool(readable) and os.read(read_fd, 1) == b"1"
+        finally:
+            os.close(read_fd)
+        if not is_ready:
+            logging.error(f"Worker {pid} did not start")
+            self.stop_worker(pid)
+            return None
+        self.workers.add(pid)
+        logging.info(f"Worker {pid} started")
+        return pid
+
+    def stop_worker(self, pid):
+        self.workers.discard(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+        remove_worker_stats(self.stats_dir, pid)
+
+    def restart_workers(self):
+        self.load_analyzer()
+        for old_pid in list(self.workers):
+            if self.start_worker() is None:
+                logging.error("Rolling restart aborted, the remaining workers keep running")
+                return
+            self.stop_worker(old_pid)
+        logging.info("Rolling restart finished")
+
+    def reap_workers(self):
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            self.workers.discard(pid)
+            remove_worker_stats(self.stats_dir, pid)
+            logging.warning(f"Worker {pid} exited with status {status}")
+
+    def add_missing_workers(self):
+        while len(self.workers) < self.workers_count:
+            if self.start_worker() is None:
+                # Try again on the next round
+                return
+
+    def request_stop(self, signal_number, frame):
+        self.stopping = True
+
+    def request_reload(self, signal_number, frame):
+        self.reload_requested = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGHUP, self.request_reload)
+        try:
+            self.load_analyzer()
+            for _ in range(self.workers_count):
+                if self.start_worker() is None:
+                    raise SystemExit(1)
+            while not self.stopping:
+                if self.reload_requested:
+                    self.reload_requested = False
+                    self.restart_workers()
+                self.reap_workers()
+                self.add_missing_workers()
+                time.sleep(SUPERVISE_INTERVAL)
+        finally:
+            for pid in list(self.workers):
+                self.stop_worker(pid)
+            self.sock.close()
+            shutil.rmtree(self.stats_dir, ignore_errors=True)
+
+
+def serve(create_app, host, port, workers_count):
+    Master(create_app, host, port, workers_count).run()
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+from mock import patch
+
+from batch import iter_batch_results, read_checkpoint, truncate_partial_line
+from resources import Resources
+
+
+async def fake_analyze_article(session, resources, url):
+    await asyncio.sleep(0)
+    return {"url": url, "status": "OK"}
+
+
+async def iter_lines(lines):
+    for line in lines:
+        yield line
+
+
+@pytest.mark.asyncio
+@patch("batch.analyze_article", new=fake_analyze_article)
+async def test_iter_batch_results_skips_checkpointed_urls():
+    resources = Resources(morph=None, negative_words=frozenset(), positive_words=frozenset())
+    lines = iter_lines([f"https://host{index % 3}.ru/{index}\n" for index in range(100)] + ["\n"])
+
+    results = [
+        article_result
+        async for article_result in iter_batch_results(
+            resources,
+            lines,
+            concurrency=4,
+            concurrency_per_host=1,
+            skip_urls={"https://host0.ru/0"},
+        )
+    ]
+
+    assert len(results) == 99
+    assert "https://host0.ru/0" not in {article_result["url"] for article_result in results}
+
+
+async def iter_broken_lines():
+    yield "https://host.ru/1\n"
+    raise OSError("input is unreadable")
+
+
+async def broken_analyze_article(session, resources, url):
+    if url.endswith("/3"):
+        raise ValueError("broken page")
+    return await fake_analyze_article(session, resources, url)
+
+
+async def collect_results(lines, concurrency=4):
+    resources = Resources(morph=None, negative_words=frozenset(), positive_words=frozenset())
+    return [article_result async for article_result in iter_batch_results(resources, lines, concurrency=concurrency)]
+
+
+@pytest.mark.asyncio
+@patch("batch.analyze_article", new=fake_analyze_article)
+async def test_iter_batch_results_raises_producer_error():
+    with pytest.raises(OSError):
+        await asyncio.wait_for(collect_results(iter_broken_lines()), timeout=2)
+
+
+@pytest.mark.asyncio
+@patch("batch.analyze_article", new=broken_analyze_article)
+async def test_iter_batch_results_raises_worker_error():
+    lines = iter_lines([f"https://host.ru/{index}\n" for index in range(10)])
+
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(collect_results(lines), timeout=2)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("content, expected", [
+    (b"", b""),
+    (b'{"url": "1"}\n', b'{"url": "1"}\n'),
+    (b'{"url": "1"}\n{"url": "2"}\n{"ur', b'{"url": "1"}\n{"url": "2"}\n'),
+    (b'{"url": "1"}\n{"url": "2', b'{"url": "1"}\n'),
+    (b'{"ur', b""),
+])
+async def test_truncate_partial_line(tmp_path, content, expected):
+    path = tmp_path / "results.jsonl"
+    path.write_bytes(content)
+
+    await truncate_partial_line(str(path), block_size=4)
+
+    assert path.read_bytes() == expected
+
+
+@pytest.mark.asyncio
+async def test_read_checkpoint_retries_transient_errors(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"url": "https://host.ru/ok", "status": "OK"}),
+        json.dumps({"url": "https://host.ru/parsing", "status": "PARSING_ERROR"}),
+        json.dumps({"url": "https://host.ru/timeout", "status": "TIMEOUT"}),
+        json.dumps({"url": "https://host.ru/fetch", "status": "FETCH_ERROR"}),
+        json.dumps({"url": "https://host.ru/large", "status": "TOO_LARGE"}),
+    ]) + "\n")
+
+    assert await read_checkpoint(str(path)) == {"https://host.ru/ok", "https://host.ru/parsing"}
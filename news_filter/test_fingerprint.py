@@ -0,0 +1,51 @@
+import random
+
+from fingerprint import DedupMatch, FingerprintIndex, get_fingerprint
+
+
+def generate_article(words_count, seed=0):
+    words = (
+        "власти объявили о новых мерах поддержки малого бизнеса по словам министра программа "
+        "заработает с начала следующего года и охватит более тысячи компаний эксперты считают"
+    ).split()
+    rng = random.Random(seed)
+    return " ".join(rng.choice(words) for _ in range(words_count))
+
+
+def test_exact_fingerprint_ignores_case_and_punctuation():
+    text = "Власти объявили о новых мерах поддержки, по словам министра."
+    assert get_fingerprint(text) == get_fingerprint("  власти ОБЪЯВИЛИ о новых мерах поддержки по словам министра!")
+
+
+def test_fingerprint_index_finds_near_duplicates():
+    index = FingerprintIndex(maxsize=2)
+    result = {"score": 1.0, "positivity_score": 2.0, "words_count": 600}
+    article_text = generate_article(600)
+    index.add(get_fingerprint(article_text), "https://inosmi.ru/a", result)
+
+    republished_text = f"{article_text} Читайте также: новости экономики"
+    match = index.find(get_fingerprint(republished_text))
+
+    assert match == DedupMatch("https://inosmi.ru/a", result, "near")
+    assert index.find(get_fingerprint(article_text)).match == "exact"
+    assert index.find(get_fingerprint(generate_article(600, seed=1))) is None
+    assert index.stats() == {"size": 1, "maxsize": 2, "exact_hits": 1, "near_hits": 1, "misses": 1}
+
+
+def test_fingerprint_index_skips_same_url():
+    index = FingerprintIndex()
+    article_text = generate_article(600)
+    index.add(get_fingerprint(article_text), "https://inosmi.ru/a", {})
+
+    assert index.find(get_fingerprint(article_text), exclude_url="https://inosmi.ru/a") is None
+    assert index.find(get_fingerprint(f"{article_text} обновлено"), exclude_url="https://inosmi.ru/a") is None
+    assert index.find(get_fingerprint(article_text), exclude_url="https://inosmi.ru/b").match == "exact"
+
+
+def test_fingerprint_index_evicts_least_recently_used():
+    index = FingerprintIndex(maxsize=1)
+    index.add(get_fingerprint(generate_article(600)), "a", {})
+    index.add(get_fingerprint(generate_article(600, seed=1)), "b", {})
+
+    assert index.find(get_fingerprint(generate_article(600))) is None
+    assert len(index) == 1
@@ -0,0 +1,59 @@
+import pymorphy2
+
+from lemma_table import NEGATIVE, POSITIVE, LazyMorphAnalyzer, LemmaTable, build, build_lemma_table
+from text_tools import split_by_words_sync
+
+
+def test_lemma_table(tmp_path):
+    morph = pymorphy2.MorphAnalyzer()
+    path = tmp_path / "lemmas.bin"
+    path.write_bytes(build_lemma_table(
+        morph, ["он", "хочет", "стало"], negative_words=["аутсайдер"], positive_words={"успех": 2.5},
+    ))
+
+    table = LemmaTable.open(str(path))
+
+    assert table.get_normal_form("Хочет") == "хотеть"
+    assert table.get_normal_form("стало") == "стать"
+    assert table.get_normal_form("аутсайдерами") == "аутсайдер"
+    assert table.get_normal_form("началом") is None
+    assert table.read_charged_words(NEGATIVE) == {"аутсайдер": 1.0}
+    assert table.read_charged_words(POSITIVE) == {"успех": 2.5}
+    assert table.stats()["misses"] == 1
+
+
+class CountingMorphAnalyzer(LazyMorphAnalyzer):
+    def __init__(self):
+        super().__init__()
+        self.parsed_words = []
+
+    def parse(self, word):
+        self.parsed_words.append(word)
+        return super().parse(word)
+
+
+def test_split_by_words_checks_table_first():
+    morph = CountingMorphAnalyzer()
+    table = LemmaTable(build_lemma_table(pymorphy2.MorphAnalyzer(), ["он", "хочет"]))
+
+    assert split_by_words_sync(morph, 'Он хочет началом', lemma_table=table) == ['хотеть', 'начало']
+    assert morph.parsed_words == ['началом']
+
+
+def test_rebuild_keeps_open_table(tmp_path):
+    corpus_path = tmp_path / "corpus.txt"
+    corpus_path.write_text("Он хочет, он хочет")
+    negative_words_path = tmp_path / "negative_words.txt"
+    negative_words_path.write_text("аутсайдер\n")
+    positive_words_path = tmp_path / "positive_words.txt"
+    positive_words_path.write_text("успех\n")
+    output_path = str(tmp_path / "lemmas.bin")
+    build([str(corpus_path)], output_path, 10, str(negative_words_path), str(positive_words_path))
+    table = LemmaTable.open(output_path)
+
+    corpus_path.write_text("стало")
+    build([str(corpus_path)], output_path, 10, str(negative_words_path), str(positive_words_path))
+
+    assert table.get_normal_form("хочет") == "хотеть"
+    assert LemmaTable.open(output_path).get_normal_form("стало") == "стать"
+    assert [path.name for path in tmp_path.iterdir() if path.suffix == ".tmp"] == []
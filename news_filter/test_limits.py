@@ -0,0 +1,53 @@
+import time
+
+import aiohttp
+import pytest
+
+from limits import AdaptiveLimiter, HostLimiter, TokenBucket
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=100, capacity=2)
+    start = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+
+    assert time.monotonic() - start >= 0.015
+
+
+def test_adaptive_limiter_aimd():
+    limiter = AdaptiveLimiter(initial_limit=4, max_limit=10, latency_target=1.0)
+    for _ in range(20):
+        limiter.record(latency=0.1, failed=False)
+    assert limiter.stats()["limit"] == 7
+
+    limiter.record(latency=0.1, failed=True)
+    limiter.record(latency=0.1, failed=True)
+    assert limiter.stats()["limit"] == 3
+
+
+@pytest.mark.asyncio
+async def test_host_limiter_counts_throttling_as_failure():
+    host_limiter = HostLimiter(rate=100, burst=10, initial_concurrency=4, max_concurrency=10, latency_target=1.0)
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        async with host_limiter.throttle("https://inosmi.ru/a"):
+            raise aiohttp.ClientResponseError(request_info=None, history=(), status=429)
+
+    stats = host_limiter.stats()["inosmi.ru"]
+    assert stats["limit"] == 2
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_host_limiter_does_not_count_rate_limiting_as_latency():
+    host_limiter = HostLimiter(rate=5, burst=1, initial_concurrency=4, max_concurrency=10, latency_target=0.05)
+
+    for _ in range(3):
+        async with host_limiter.throttle("https://inosmi.ru/a"):
+            pass
+
+    stats = host_limiter.stats()["inosmi.ru"]
+    assert stats["latency"] < 0.05
+    assert stats["limit"] == 4
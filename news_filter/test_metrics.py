@@ -0,0 +1,21 @@
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_render():
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Requests."))
+    latency = registry.register(Histogram("latency_seconds", "Latency.", buckets=(0.1, 1)))
+    registry.register(Gauge("queue_size", "Queue size.", lambda: 3))
+
+    requests.inc(status="OK")
+    requests.inc(status="OK")
+    latency.observe(0.5, stage="fetch")
+
+    text = registry.render()
+
+    assert 'requests_total{status="OK"} 2.0' in text
+    assert 'latency_seconds_bucket{stage="fetch",le="0.1"} 0' in text
+    assert 'latency_seconds_bucket{stage="fetch",le="1.0"} 1' in text
+    assert 'latency_seconds_bucket{stage="fetch",le="+Inf"} 1' in text
+    assert 'latency_seconds_count{stage="fetch"} 1' in text
+    assert "queue_size 3.0" in text
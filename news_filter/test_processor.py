@@ -1,27 +1,34 @@
 import pytest
 import aiohttp
 import pymorphy2
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 
 from mock import patch, AsyncMock, MagicMock
 
-from processor import process_article
+from adapters import ADAPTERS
+from fingerprint import FingerprintIndex
+from processor import ArticleTooLarge, Page, analyze_articles, fetch, process_article
+from resources import Resources, create_executor
+from result_cache import MemoryResultCache
+
+ARTICLE_URL = "https://inosmi.ru/economic/20190629/245384784.html"
 
 @pytest.fixture
-def morph():
-    return pymorphy2.MorphAnalyzer()
+def resources():
+    return Resources(pymorphy2.MorphAnalyzer(), frozenset(), frozenset())
 
 
 
 @pytest.mark.asyncio
-@patch("processor.fetch", new_callable=AsyncMock, return_value="</script></body></html>")
-async def test_parse_error(mocked_fetch, morph):
+@patch("processor.fetch", new_callable=AsyncMock, return_value=Page("</script></body></html>", None, None))
+async def test_parse_error(mocked_fetch, resources):
     session = MagicMock()
     result=[]
     await process_article(
         session=session, 
-        morph=morph, 
-        charged_words=[],
-        url="url",
+        resources=resources,
+        url=ARTICLE_URL,
         result=result,
     )
     mocked_fetch.assert_called()
@@ -29,14 +36,197 @@ async def test_parse_error(mocked_fetch, morph):
 
 
 @pytest.mark.asyncio
-async def test_fetch_error(morph):
+async def test_fetch_error(resources, monkeypatch):
+    monkeypatch.setitem(ADAPTERS, "lenta", "adapters.inosmi_ru")
     result=[]
     async with aiohttp.ClientSession() as session:
         await process_article(
             session=session, 
-            morph=morph, 
-            charged_words=[],
+            resources=resources,
             url="https://lenta/vvvv",
             result=result,
         )
     assert result[0]["status"] == "FETCH_ERROR"
+
+
+@pytest.mark.asyncio
+@patch(
+    "processor.fetch",
+    new_callable=AsyncMock,
+    return_value=Page('<div class="layout-article"><p>Он хочет, чтобы</p></div>', None, None),
+)
+async def test_process_article_in_executor(mocked_fetch, resources):
+    resources.executor = create_executor(1)
+    result = []
+    try:
+        await process_article(
+            session=MagicMock(),
+            resources=resources,
+            url=ARTICLE_URL,
+            result=result,
+        )
+    finally:
+        await resources.close()
+    assert result[0]["status"] == "OK"
+    assert result[0]["words_count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_result_cache_revalidation(resources):
+    resources.result_cache = MemoryResultCache(ttl=0)
+    page = Page('<div class="layout-article"><p>Он хочет, чтобы</p></div>', '"v1"', None)
+
+    with patch("processor.fetch", new_callable=AsyncMock, return_value=page) as mocked_fetch:
+        await process_article(session=MagicMock(), resources=resources, url=ARTICLE_URL, result=[])
+    assert mocked_fetch.call_args.kwargs["headers"] is None
+
+    result = []
+    with patch("processor.fetch", new_callable=AsyncMock, return_value=None) as mocked_fetch:
+        await process_article(session=MagicMock(), resources=resources, url=ARTICLE_URL, result=result)
+    assert mocked_fetch.call_args.kwargs["headers"] == {"If-None-Match": '"v1"'}
+    assert result[0]["status"] == "OK"
+    assert result[0]["words_count"] == 2
+    assert resources.result_cache.revalidations == 1
+
+
+@pytest.mark.asyncio
+@patch("processor.fetch", new_callable=AsyncMock, return_value=None)
+async def test_not_modified_without_cached_result(mocked_fetch, resources):
+    result = []
+    await process_article(session=MagicMock(), resources=resources, url=ARTICLE_URL, result=result)
+
+    assert mocked_fetch.call_args.kwargs["headers"] is None
+    assert result[0]["status"] == "FETCH_ERROR"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_for_same_url_are_coalesced(resources):
+    page = Page('<div class="layout-article"><p>Он хочет, чтобы</p></div>', None, None)
+    resources.session = MagicMock()
+
+    with patch("processor.fetch", new_callable=AsyncMock, return_value=page) as mocked_fetch:
+        result = await analyze_articles(resources, [ARTICLE_URL, ARTICLE_URL, ARTICLE_URL])
+
+    assert mocked_fetch.call_count == 1
+    assert [article["status"] for article in result] == ["OK", "OK", "OK"]
+
+
+async def handle_long_page(request):
+    response = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+    await response.prepare(request)
+    await response.write('<html><body><div class="layout-article"><p>Он хочет</p></div>'.encode())
+    for _ in range(100):
+        await response.write(f'<p>{"Подвал страницы " * 100}</p>'.encode())
+    await response.write_eof()
+    return response
+
+
+@pytest.mark.asyncio
+async def test_fetch_stops_after_article():
+    app = web.Application()
+    app.add_routes([web.get("/", handle_long_page)])
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        page = await fetch(session, str(server.make_url("/")), container=("div", "layout-article"))
+
+    assert '<p>Он хочет</p></div>' in page.html
+    assert len(page.html.encode()) < 100 * 3000
+
+
+async def handle_cp1251_page(request):
+    meta = '<meta charset="windows-1251">' if request.query.get("meta") else ""
+    body = f'<html><head>{meta}</head><body><div class="layout-article"><p>{"Он хочет, чтобы " * 20}</p></div>'
+    return web.Response(body=body.encode("cp1251"), headers={"Content-Type": "text/html"})
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query", ["?meta=1", ""])
+async def test_fetch_detects_encoding_without_charset(query):
+    app = web.Application()
+    app.add_routes([web.get("/", handle_cp1251_page)])
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        page = await fetch(session, str(server.make_url("/")) + query, container=("div", "layout-article"))
+
+    assert "<p>Он хочет, чтобы" in page.html
+    assert page.peak_memory >= len(page.html)
+
+
+@pytest.mark.asyncio
+async def test_fetch_too_large():
+    app = web.Application()
+    app.add_routes([web.get("/", handle_long_page)])
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        with pytest.raises(ArticleTooLarge):
+            await fetch(session, str(server.make_url("/")), max_bytes=100)
+
+
+@pytest.mark.asyncio
+@patch("processor.fetch", new_callable=AsyncMock)
+async def test_unknown_site(mocked_fetch, resources):
+    result = []
+    await process_article(session=MagicMock(), resources=resources, url="https://example.com/", result=result)
+
+    mocked_fetch.assert_not_called()
+    assert result[0]["status"] == "PARSING_ERROR"
+
+
+@pytest.mark.asyncio
+async def test_stage_timings_and_metrics(resources):
+    page = Page('<div class="layout-article"><p>Он хочет, чтобы</p></div>', None, None, 1000)
+    resources.session = MagicMock()
+
+    with patch("processor.fetch", new_callable=AsyncMock, return_value=page):
+        result = await analyze_articles(resources, [ARTICLE_URL], debug=True)
+
+    assert set(result[0]["timings"]) == {"fetch", "sanitize", "lemmatize", "score"}
+    assert resources.articles_total.get(status="OK") == 1
+    assert 'news_filter_stage_seconds_count{stage="lemmatize"} 1' in resources.metrics.render()
+    assert "news_filter_page_memory_bytes_count 1" in resources.metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_republished_text_reuses_score(resources):
+    resources.fingerprint_index = FingerprintIndex()
+    resources.session = MagicMock()
+    page = Page('<div class="layout-article"><p>Он хочет, чтобы</p></div>', None, None)
+    republished_url = "https://inosmi.ru/politic/20190629/245384785.html"
+
+    with patch("processor.fetch", new_callable=AsyncMock, return_value=page):
+        original = await analyze_articles(resources, [ARTICLE_URL])
+        republished = await analyze_articles(resources, [republished_url], debug=True)
+
+    assert original[0]["dedup"] is None
+    assert republished[0]["dedup"] == {"url": ARTICLE_URL, "match": "exact"}
+    assert republished[0]["words_count"] == original[0]["words_count"] == 2
+    assert "lemmatize" not in republished[0]["timings"]
+    assert resources.dedup_total.get(match="exact") == 1
+
+
+@pytest.mark.asyncio
+async def test_parse_errors_are_not_deduplicated(resources):
+    resources.fingerprint_index = FingerprintIndex()
+    resources.session = MagicMock()
+    page = Page("<html><body><p>Not an article</p></body></html>", None, None)
+    other_url = "https://inosmi.ru/politic/20190629/245384785.html"
+
+    with patch("processor.fetch", new_callable=AsyncMock, return_value=page):
+        result = await analyze_articles(resources, [ARTICLE_URL])
+        other_result = await analyze_articles(resources, [other_url])
+
+    assert [result[0]["status"], other_result[0]["status"]] == ["PARSING_ERROR", "PARSING_ERROR"]
+    assert other_result[0]["dedup"] is None
+    assert other_result[0]["score"] is None
+    assert len(resources.fingerprint_index) == 0
+
+
+@pytest.mark.asyncio
+async def test_reanalyzed_url_is_not_its_own_republication(resources):
+    resources.fingerprint_index = FingerprintIndex()
+    resources.session = MagicMock()
+    page = Page('<div class="layout-article"><p>Он хочет, чтобы</p></div>', None, None)
+
+    with patch("processor.fetch", new_callable=AsyncMock, return_value=page):
+        await analyze_articles(resources, [ARTICLE_URL])
+        result = await analyze_articles(resources, [ARTICLE_URL])
+
+    assert result[0]["dedup"] is None
+    assert result[0]["words_count"] == 2
@@ -0,0 +1,28 @@
+from result_cache import MemoryResultCache, SqliteResultCache, get_validation_headers
+
+
+def test_memory_result_cache_evicts_least_recently_used():
+    cache = MemoryResultCache(ttl=60, maxsize=2)
+    cache.set("a", {"score": 1.0})
+    cache.set("b", {"score": 2.0})
+    cache.get("a")
+    cache.set("c", {"score": 3.0})
+
+    assert cache.get("b") is None
+    assert cache.get("a").result == {"score": 1.0}
+    assert cache.is_fresh(cache.get("c"))
+
+
+def test_sqlite_result_cache_keeps_validators(tmp_path):
+    cache = SqliteResultCache(ttl=0, path=str(tmp_path / "results.sqlite3"))
+    cache.set("a", {"score": 1.0}, etag='"v1"', last_modified="Sat, 29 Jun 2019 10:00:00 GMT")
+
+    entry = cache.get("a")
+
+    assert entry.result == {"score": 1.0}
+    assert not cache.is_fresh(entry)
+    assert get_validation_headers(entry) == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Sat, 29 Jun 2019 10:00:00 GMT",
+    }
+    cache.close()
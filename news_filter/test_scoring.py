@@ -0,0 +1,35 @@
+from collections import Counter
+
+from scoring import LexiconScorer, Score, create_lexicon, read_charged_words
+
+
+def test_lexicon_scorer():
+    scorer = LexiconScorer([
+        create_lexicon("negative", {"аутсайдер", "банкротство"}),
+        create_lexicon("positive", {"успех": 2.0}),
+    ])
+
+    assert scorer.score(["аутсайдер", "успех", "аутсайдер", "побег"]).rates == {"negative": 50.0, "positive": 50.0}
+    assert scorer.score([]) == Score({"negative": 0.0, "positive": 0.0}, None)
+
+
+def test_lexicon_scorer_with_hits():
+    scorer = LexiconScorer([
+        create_lexicon("negative", {"аутсайдер": 1.0, "банкротство": 1.5}),
+        create_lexicon("positive", {"успех": 1.0, "аутсайдер": -0.5}),
+    ])
+
+    score = scorer.score(["аутсайдер", "успех", "аутсайдер", "банкротство", "побег"], with_hits=True)
+
+    assert score.rates == {"negative": 70.0, "positive": 0.0}
+    assert score.hits == {
+        "negative": Counter({"аутсайдер": 2, "банкротство": 1}),
+        "positive": Counter({"аутсайдер": 2, "успех": 1}),
+    }
+
+
+def test_read_charged_words(tmp_path):
+    path = tmp_path / "words.txt"
+    path.write_text("аутсайдер\nбанкротство\t2.5\nмедовый месяц \n\n")
+
+    assert read_charged_words(str(path)) == {"аутсайдер": 1.0, "банкротство": 2.5, "медовый месяц": 1.0}
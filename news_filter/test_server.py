@@ -0,0 +1,63 @@
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from mock import patch
+
+from resources import Resources
+from server import handle, handle_batch
+
+
+async def fake_analyze_article(session, resources, url):
+    return {"url": url, "score": 1.0, "positivity_score": 0.0, "words_count": 10, "status": "OK"}
+
+
+def create_test_client():
+    app = web.Application()
+    app["resources"] = Resources(morph=None, negative_words=frozenset(), positive_words=frozenset())
+    app.add_routes([web.get('/', handle), web.post('/batch', handle_batch)])
+    return TestClient(TestServer(app))
+
+
+@pytest.mark.asyncio
+@patch("processor.analyze_article", new=fake_analyze_article)
+async def test_json_response_is_default():
+    async with create_test_client() as client:
+        response = await client.get("/?urls=a,b")
+
+        assert response.content_type == "application/json"
+        assert sorted(article["url"] for article in await response.json()) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+@patch("processor.analyze_article", new=fake_analyze_article)
+async def test_ndjson_stream():
+    async with create_test_client() as client:
+        response = await client.get("/?urls=a,b&format=ndjson")
+
+        assert response.content_type == "application/x-ndjson"
+        lines = (await response.text()).splitlines()
+        assert sorted(json.loads(line)["url"] for line in lines) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+@patch("processor.analyze_article", new=fake_analyze_article)
+async def test_sse_stream_by_accept_header():
+    async with create_test_client() as client:
+        response = await client.get("/?urls=a", headers={"Accept": "text/event-stream"})
+
+        assert response.content_type == "text/event-stream"
+        events = (await response.text()).strip().split("\n\n")
+        assert events[0].startswith("event: article\ndata: ")
+        assert events[-1] == "event: end\ndata: {}"
+
+
+@pytest.mark.asyncio
+@patch("batch.analyze_article", new=fake_analyze_article)
+async def test_batch_endpoint():
+    async with create_test_client() as client:
+        response = await client.post("/batch", data="a\nb\n\nc\n")
+
+        lines = (await response.text()).splitlines()
+        assert sorted(json.loads(line)["url"] for line in lines) == ["a", "b", "c"]
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_result():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    results = await asyncio.gather(*[single_flight.run("key", work, 21) for _ in range(3)])
+
+    assert results == [42, 42, 42]
+    assert calls == [21]
+    assert single_flight.stats() == {"in_flight": 0, "coalesced": 2}
+
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_cancelled_caller():
+    single_flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    first = asyncio.ensure_future(single_flight.run("key", work))
+    second = asyncio.ensure_future(single_flight.run("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cancels_abandoned_work():
+    single_flight = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.ensure_future(single_flight.run("key", work))
+    await started.wait()
+    caller.cancel()
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_single_flight_restarts_work_joined_while_cancelled():
+    single_flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def work():
+        started.set()
+        await asyncio.sleep(0.01)
+        return "done"
+
+    first = asyncio.ensure_future(single_flight.run("key", work))
+    await started.wait()
+    first.cancel()
+    # The abandoned task is cancelled now, but it has not seen the cancellation yet
+    await asyncio.sleep(0)
+
+    assert await single_flight.run("key", work) == "done"
+    assert first.cancelled()
+    assert single_flight.stats() == {"in_flight": 0, "coalesced": 0}
@@ -0,0 +1,50 @@
+import gc
+import json
+import os
+import shutil
+import weakref
+
+import supervisor
+from supervisor import Master, aggregate_cache_stats, read_workers_stats, write_worker_stats
+
+
+class Analyzer:
+    pass
+
+
+def test_reload_collects_previous_analyzer(monkeypatch):
+    monkeypatch.setattr(supervisor, "load_analyzer", Analyzer)
+    master = Master(None, "127.0.0.1", 0, 1)
+    try:
+        master.load_analyzer()
+        # A reference cycle, as in real analyzers, is only freed by the collector
+        master.analyzer.cycle = master.analyzer
+        previous_analyzer = weakref.ref(master.analyzer)
+
+        master.load_analyzer()
+
+        assert previous_analyzer() is None
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+        master.sock.close()
+        shutil.rmtree(master.stats_dir)
+
+
+def test_aggregate_cache_stats(tmp_path):
+    stats = {
+        "lemma_cache": {"size": 10, "maxsize": 100, "hits": 5, "misses": 10, "evictions": 0},
+        "result_cache": None,
+        "in_flight": {"in_flight": 1},
+    }
+    write_worker_stats(str(tmp_path), stats)
+    (tmp_path / "1.json").write_text(json.dumps({
+        **stats, "lemma_cache": {"size": 20, "maxsize": 100, "hits": 1, "misses": 20, "evictions": 2},
+    }))
+
+    workers_stats = read_workers_stats(str(tmp_path))
+
+    assert sorted(workers_stats) == sorted([1, os.getpid()])
+    assert aggregate_cache_stats(workers_stats) == {
+        "lemma_cache": {"size": 30, "maxsize": 100, "hits": 6, "misses": 30, "evictions": 2},
+    }
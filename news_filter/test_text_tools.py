@@ -0,0 +1,61 @@
+import pymorphy2
+import pytest
+
+from lemma_table import LemmaTable, build_lemma_table
+from text_tools import LemmaCache, split_by_words, split_by_words_sync
+
+
+@pytest.mark.asyncio
+async def test_split_by_words():
+    # Экземпляры MorphAnalyzer занимают 10-15Мб RAM т.к. загружают в память много данных
+    # Старайтесь организовать свой код так, чтоб создавать экземпляр MorphAnalyzer заранее и в единственном числе
+    morph = pymorphy2.MorphAnalyzer()
+
+    assert await split_by_words(morph, 'Во-первых, он хочет, чтобы') == ['во-первых', 'хотеть', 'чтобы']
+
+    assert await split_by_words(morph, '«Удивительно, но это стало началом!»') == ['удивительно', 'это', 'стать', 'начало']
+
+
+@pytest.mark.asyncio
+async def test_split_by_words_in_chunks():
+    morph = pymorphy2.MorphAnalyzer()
+    text = '«Удивительно, но это стало началом!»'
+
+    for chunk_size in (1, 2, 100):
+        assert await split_by_words(morph, text, chunk_size=chunk_size) == ['удивительно', 'это', 'стать', 'начало']
+
+
+def test_split_by_words_sync():
+    morph = pymorphy2.MorphAnalyzer()
+
+    assert split_by_words_sync(morph, '«Удивительно, но это стало началом!»') == ['удивительно', 'это', 'стать', 'начало']
+
+
+@pytest.mark.asyncio
+async def test_split_by_words_with_lemma_cache():
+    morph = pymorphy2.MorphAnalyzer()
+    lemma_cache = LemmaCache(maxsize=2)
+
+    words = await split_by_words(morph, 'Он хочет, он хочет', lemma_cache=lemma_cache)
+
+    assert words == ['хотеть', 'хотеть']
+    assert lemma_cache.stats() == {"size": 2, "maxsize": 2, "hits": 2, "misses": 2, "evictions": 0}
+
+    await split_by_words(morph, 'началом', lemma_cache=lemma_cache)
+
+    assert len(lemma_cache) == 2
+    assert lemma_cache.evictions == 1
+
+
+def test_split_by_words_checks_lemma_cache_before_table():
+    morph = pymorphy2.MorphAnalyzer()
+    table = LemmaTable(build_lemma_table(morph, ['хочет']))
+    lemma_cache = LemmaCache()
+
+    assert split_by_words_sync(morph, 'хочет хочет началом', lemma_cache, table) == ['хотеть', 'хотеть', 'начало']
+    assert split_by_words_sync(morph, 'хочет началом', lemma_cache, table) == ['хотеть', 'начало']
+
+    # Таблица видит только первые промахи кэша, повторы находятся в кэше
+    assert table.stats()['hits'] == 1
+    assert table.stats()['misses'] == 1
+    assert lemma_cache.stats()['hits'] == 3
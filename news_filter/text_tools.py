@@ -1,46 +1,118 @@
 import asyncio
-import pymorphy2
+from collections import OrderedDict
 import string
 
 
+# FIXME какие еще знаки пунктуации часто встречаются ?
+_REMOVED_CHARS_TABLE = str.maketrans('', '', '«»…')
+
+
 def _clean_word(word):
-    word = word.replace('«', '').replace('»', '').replace('…', '')
-    # FIXME какие еще знаки пунктуации часто встречаются ?
-    word = word.strip(string.punctuation)
-    return word
+    return word.translate(_REMOVED_CHARS_TABLE).strip(string.punctuation)
+
+
+class LemmaCache:
+    """LRU-кэш словоформа -> нормальная форма, общий для всех статей и запросов.
+
+    В новостях одни и те же словоформы повторяются постоянно, а morph.parse дорогой.
+    """
+
+    def __init__(self, maxsize=100_000):
+        self.maxsize = maxsize
+        self._normal_forms = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._normal_forms)
+
+    def get_normal_form(self, morph, word, lemma_table=None):
+        # morph.parse не различает регистр, поэтому "Он" и "он" делят одну запись
+        word = word.lower()
+        normal_form = self._normal_forms.get(word)
+        if normal_form is not None:
+            self.hits += 1
+            self._normal_forms.move_to_end(word)
+            return normal_form
+
+        self.misses += 1
+        # Промахи ищутся в готовой таблице, morph разбирает только то, чего нет и в ней
+        normal_form = lemma_table.get_normal_form(word) if lemma_table is not None else None
+        if normal_form is None:
+            normal_form = morph.parse(word)[0].normal_form
+        self._normal_forms[word] = normal_form
+        if len(self._normal_forms) > self.maxsize:
+            self._normal_forms.popitem(last=False)
+            self.evictions += 1
+        return normal_form
+
+    def stats(self):
+        return {
+            "size": len(self._normal_forms),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
 
 
-async def split_by_words(morph, text):
-    """Учитывает знаки пунктуации, регистр и словоформы, выкидывает предлоги."""
+def _normalize_word(morph, word, lemma_cache=None, lemma_table=None):
+    cleaned_word = _clean_word(word)
+    if lemma_cache is not None:
+        # Частые словоформы находятся в кэше, не доходя до двоичного поиска по таблице
+        return lemma_cache.get_normal_form(morph, cleaned_word, lemma_table)
+    if lemma_table is not None:
+        normal_form = lemma_table.get_normal_form(cleaned_word)
+        if normal_form is not None:
+            return normal_form
+    return morph.parse(cleaned_word)[0].normal_form
+
+
+def _normalize_words(morph, tokens, lemma_cache=None, lemma_table=None):
     words = []
-    for word in text.split():
-        cleaned_word = _clean_word(word)
-        normalized_word = morph.parse(cleaned_word)[0].normal_form
+    for word in tokens:
+        normalized_word = _normalize_word(morph, word, lemma_cache, lemma_table)
         if len(normalized_word) > 2 or normalized_word == 'не':
             words.append(normalized_word)
+    return words
+
+
+async def split_by_words(morph, text, lemma_cache=None, chunk_size=1, lemma_table=None):
+    """Учитывает знаки пунктуации, регистр и словоформы, выкидывает предлоги.
+
+    Управление циклу событий отдаётся после каждых chunk_size слов.
+    Словоформы ищутся в кэше lemma_cache, затем в готовой таблице lemma_table, morph разбирает только промахи.
+    """
+    words = []
+    tokens = text.split()
+    for start in range(0, len(tokens), chunk_size):
+        words.extend(_normalize_words(morph, tokens[start:start + chunk_size], lemma_cache, lemma_table))
         await asyncio.sleep(0)
     return words
 
 
-def test_split_by_words():
-    # Экземпляры MorphAnalyzer занимают 10-15Мб RAM т.к. загружают в память много данных
-    # Старайтесь организовать свой код так, чтоб создавать экземпляр MorphAnalyzer заранее и в единственном числе
-    morph = pymorphy2.MorphAnalyzer()
+def split_by_words_sync(morph, text, lemma_cache=None, lemma_table=None):
+    """То же, что split_by_words, но без переключений на цикл событий: для запуска в процессе-воркере."""
+    return _normalize_words(morph, text.split(), lemma_cache, lemma_table)
 
-    assert split_by_words(morph, 'Во-первых, он хочет, чтобы') == ['во-первых', 'хотеть', 'чтобы']
 
-    assert split_by_words(morph, '«Удивительно, но это стало началом!»') == ['удивительно', 'это', 'стать', 'начало']
+def _to_rate(found_count, words_count):
+    if not words_count:
+        return 0.0
+    return round(found_count / words_count * 100, 2)
 
 
 def calculate_jaundice_rate(article_words, charged_words):
-    """Расчитывает желтушность текста, принимает список "заряженных" слов и ищет их внутри article_words."""
+    """Расчитывает желтушность текста, принимает "заряженные" слова и ищет их внутри article_words.
 
-    if not article_words:
-        return 0.0
+    Для повторных вызовов передавайте charged_words готовым frozenset, иначе множество строится на каждый вызов.
+    """
 
-    found_charged_words = [word for word in article_words if word in set(charged_words)]
-    score = len(found_charged_words) / len(article_words) * 100
-    return round(score, 2)
+    if not isinstance(charged_words, (set, frozenset)):
+        charged_words = frozenset(charged_words)
+    found_count = sum(1 for word in article_words if word in charged_words)
+    return _to_rate(found_count, len(article_words))
 
 
 def test_calculate_jaundice_rate():
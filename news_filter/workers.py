@@ -0,0 +1,51 @@
+"""Lemmatization in a process pool.
+
+Every worker process loads its own MorphAnalyzer and lemma cache once, in the
+pool initializer, so tasks only carry the article HTML, its text and the list
+of words. Sanitizing and lemmatization are separate tasks, so that the
+lemmatization of a text seen before is skipped.
+With a lemma table the workers map the same file and share its pages, and
+MorphAnalyzer is loaded only when a word misses the table.
+"""
+import time
+
+import pymorphy2
+
+from adapters import get_adapter
+from fingerprint import get_fingerprint
+from lemma_table import LazyMorphAnalyzer, LemmaTable
+from text_tools import LemmaCache, split_by_words_sync
+
+_morph = None
+_lemma_cache = None
+_lemma_table = None
+
+
+def init_worker(lemma_cache_size, lemma_table_path=None):
+    global _morph, _lemma_cache, _lemma_table
+    if lemma_table_path:
+        _lemma_table = LemmaTable.open(lemma_table_path)
+        _morph = LazyMorphAnalyzer()
+    else:
+        _morph = pymorphy2.MorphAnalyzer()
+    _lemma_cache = LemmaCache(maxsize=lemma_cache_size)
+
+
+def sanitize_and_fingerprint(url, html):
+    """Return article plaintext, its fingerprint and seconds taken by the sanitize and fingerprint stages."""
+    start = time.monotonic()
+    cleaned_body = get_adapter(url).sanitize(html, plaintext=True)
+    sanitized_at = time.monotonic()
+    fingerprint = get_fingerprint(cleaned_body)
+    timings = {
+        "sanitize": sanitized_at - start,
+        "fingerprint": time.monotonic() - sanitized_at,
+    }
+    return cleaned_body, fingerprint, timings
+
+
+def split(text):
+    """Return article words and seconds taken to lemmatize them."""
+    start = time.monotonic()
+    words = split_by_words_sync(_morph, text, lemma_cache=_lemma_cache, lemma_table=_lemma_table)
+    return words, {"lemmatize": time.monotonic() - start}
@@ -0,0 +1,125 @@
+"""Download throughput of a large archive with and without sendfile.
+
+A temporary archive of random photos is served by server.py in a child
+process over plain HTTP on localhost, once with member data sent by sendfile
+and once with NO_SENDFILE, where it goes through Python by chunks. The first
+download computes the CRCs, the next ones take them from the manifest cache,
+so both are measured. Prints MB/s as JSON. Run from the photos_archiver
+directory:
+
+    python -m benchmarks.throughput --files 8 --file-size-mb 128 --downloads 3
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ARCHIVE_HASH = 'benchmark'
+SERVER_CODE = 'import server; server.web.run_app(server.create_app(), port={port}, print=None)'
+
+
+def create_photos(photos_root, files_count, file_size):
+    photos_dir = os.path.join(photos_root, 'photos', ARCHIVE_HASH)
+    os.makedirs(photos_dir)
+    for number in range(files_count):
+        with open(os.path.join(photos_dir, f'{number}.jpg'), 'wb') as photo:
+            # Random bytes by blocks, to not hold a whole photo in memory
+            for _ in range(file_size // 2 ** 20):
+                photo.write(os.urandom(2 ** 20))
+            photo.write(os.urandom(file_size % 2 ** 20))
+
+
+def get_free_port():
+    with socket.socket() as free_socket:
+        free_socket.bind(('127.0.0.1', 0))
+        return free_socket.getsockname()[1]
+
+
+def start_server(photos_root, port, sendfile):
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.getcwd(),
+        MANIFEST_CACHE_DIR='',
+    )
+    for name in ('NO_SENDFILE', 'DOWNLOAD_RATE', 'ARCHIVE_RATE', 'EGRESS_RATE'):
+        env.pop(name, None)
+    if not sendfile:
+        env['NO_SENDFILE'] = '1'
+    process = subprocess.Popen([sys.executable, '-c', SERVER_CODE.format(port=port)], cwd=photos_root, env=env)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            return process
+        except ConnectionRefusedError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('server did not start')
+
+
+def download(port):
+    """Read the archive into one reused buffer, so that the client costs as little as possible."""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    buffer = memoryview(bytearray(2 ** 20))
+    start = time.perf_counter()
+    connection.request('GET', f'/archive/{ARCHIVE_HASH}/')
+    response = connection.getresponse()
+    size = 0
+    while True:
+        read_size = response.readinto(buffer)
+        if not read_size:
+            break
+        size += read_size
+    taken_time = time.perf_counter() - start
+    connection.close()
+    return size, taken_time
+
+
+def measure(photos_root, sendfile, downloads_count):
+    port = get_free_port()
+    process = start_server(photos_root, port, sendfile)
+    try:
+        results = []
+        for number in range(downloads_count):
+            size, taken_time = download(port)
+            results.append({
+                'sendfile': sendfile,
+                'download': 'first' if number == 0 else 'cached_crcs',
+                'seconds': round(taken_time, 3),
+                'mb_per_sec': round(size / 2 ** 20 / taken_time, 1),
+            })
+        return size, results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(files_count, file_size_mb, downloads_count):
+    photos_root = tempfile.mkdtemp()
+    try:
+        create_photos(photos_root, files_count, int(file_size_mb * 2 ** 20))
+        results = []
+        for sendfile in (False, True):
+            size, sendfile_results = measure(photos_root, sendfile, downloads_count)
+            results.extend(sendfile_results)
+    finally:
+        shutil.rmtree(photos_root)
+
+    print(json.dumps({
+        'archive_mb': round(size / 2 ** 20, 1),
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive download throughput benchmark')
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--file-size-mb', type=float, default=128)
+    parser.add_argument('--downloads', type=int, default=3, help='Downloads of the archive per server.')
+    args = parser.parse_args()
+    main(args.files, args.file_size_mb, args.downloads)
@@ -0,0 +1,209 @@
+"""Cache of archive manifests: files, sizes, mtimes and CRCs of every archive.
+
+Walking a directory of thousands of photos on network storage is slow, and
+the CRCs cost a full read of every file. Manifests are kept in memory with LRU
+eviction and, if a folder is configured, persisted to a sidecar JSON file per
+archive, so they survive restarts.
+
+A cached manifest is checked with a stat of the directories it was scanned
+from: adding, removing or renaming a photo changes the mtime of its
+directory. A photo overwritten in place does not, so a manifest older than
+the recheck interval is scanned again anyway, and with `watchdog` installed
+the manifest is dropped as soon as anything in the archive changes.
+"""
+import asyncio
+from collections import OrderedDict, namedtuple
+import json
+import logging
+import os
+import time
+
+from zipstream import ArchiveLayout, ZipMember, scan_members
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+MANIFEST_VERSION = 1
+
+Manifest = namedtuple('Manifest', ['layout', 'dir_mtimes', 'scanned_at'])
+
+
+def is_fresh(manifest, recheck_interval):
+    if time.time() - manifest.scanned_at > recheck_interval:
+        return False
+    for directory, mtime in manifest.dir_mtimes.items():
+        try:
+            if os.stat(directory).st_mtime != mtime:
+                return False
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def scan_manifest(photos_dir, previous=None):
+    dir_mtimes = {}
+    members = scan_members(photos_dir, dir_mtimes)
+    crcs = {}
+    if previous is not None:
+        # CRCs of files that did not change are carried over
+        previous_crcs = {
+            previous.layout.members[index]: crc for index, crc in previous.layout.crcs.items()
+        }
+        crcs = {
+            index: previous_crcs[member]
+            for index, member in enumerate(members)
+            if member in previous_crcs
+        }
+    return Manifest(ArchiveLayout(members, crcs), dir_mtimes, time.time())
+
+
+def dump_manifest(manifest):
+    return {
+        'version': MANIFEST_VERSION,
+        'scanned_at': manifest.scanned_at,
+        'dir_mtimes': manifest.dir_mtimes,
+        'members': [
+            [*member, manifest.layout.crcs.get(index)]
+            for index, member in enumerate(manifest.layout.members)
+        ],
+    }
+
+
+def load_manifest(data):
+    if data.get('version') != MANIFEST_VERSION:
+        return None
+    members = []
+    crcs = {}
+    for index, (*fields, crc) in enumerate(data['members']):
+        members.append(ZipMember(*fields))
+        if crc is not None:
+            crcs[index] = crc
+    return Manifest(ArchiveLayout(members, crcs), data['dir_mtimes'], data['scanned_at'])
+
+
+class ManifestCache:
+    def __init__(self, maxsize=1000, sidecar_dir=None, recheck_interval=300):
+        self.maxsize = maxsize
+        self.sidecar_dir = sidecar_dir
+        self.recheck_interval = recheck_interval
+        self._manifests = OrderedDict()
+        # Number of known CRCs when the sidecar was written, to skip writing it again for nothing
+        self._saved_crcs = {}
+        self._observer = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if sidecar_dir:
+            os.makedirs(sidecar_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._manifests)
+
+    def _get_sidecar_path(self, photos_dir):
+        return os.path.join(self.sidecar_dir, f'{os.path.basename(os.path.normpath(photos_dir))}.json')
+
+    def _read_sidecar(self, photos_dir):
+        if not self.sidecar_dir:
+            return None
+        try:
+            with open(self._get_sidecar_path(photos_dir)) as sidecar:
+                return load_manifest(json.load(sidecar))
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def _write_sidecar(self, photos_dir, manifest):
+        path = self._get_sidecar_path(photos_dir)
+        with open(f'{path}.tmp', 'w') as sidecar:
+            json.dump(dump_manifest(manifest), sidecar)
+        os.replace(f'{path}.tmp', path)
+
+    def _get_fresh_manifest(self, photos_dir):
+        """Runs in a thread: every check and scan stats files."""
+        manifest = self._manifests.get(photos_dir) or self._read_sidecar(photos_dir)
+        if manifest is not None and is_fresh(manifest, self.recheck_interval):
+            self.hits += 1
+            return manifest
+        self.misses += 1
+        return scan_manifest(photos_dir, previous=manifest)
+
+    async def get_layout(self, photos_dir):
+        manifest = await asyncio.get_running_loop().run_in_executor(None, self._get_fresh_manifest, photos_dir)
+        self._manifests[photos_dir] = manifest
+        self._manifests.move_to_end(photos_dir)
+        if len(self._manifests) > self.maxsize:
+            evicted_dir, _ = self._manifests.popitem(last=False)
+            self._saved_crcs.pop(evicted_dir, None)
+        return manifest.layout
+
+    async def save(self, photos_dir):
+        """Persist the manifest with the CRCs computed by the downloads so far."""
+        manifest = self._manifests.get(photos_dir)
+        if not self.sidecar_dir or manifest is None:
+            return
+        crcs_count = len(manifest.layout.crcs)
+        if self._saved_crcs.get(photos_dir) == crcs_count:
+            return
+        self._saved_crcs[photos_dir] = crcs_count
+        await asyncio.get_running_loop().run_in_executor(None, self._write_sidecar, photos_dir, manifest)
+
+    def invalidate(self, photos_dir):
+        if self._manifests.pop(photos_dir, None) is not None:
+            self.invalidations += 1
+        self._saved_crcs.pop(photos_dir, None)
+        if self.sidecar_dir:
+            try:
+                os.remove(self._get_sidecar_path(photos_dir))
+            except FileNotFoundError:
+                pass
+
+    def start_watching(self, photos_root):
+        """Drop manifests on file system events, does nothing without watchdog."""
+        if Observer is None:
+            logging.info('watchdog is not installed, manifests are checked by directory mtimes')
+            return
+        if not os.path.isdir(photos_root):
+            return
+        self._observer = Observer()
+        self._observer.schedule(
+            InvalidatingEventHandler(self, photos_root, asyncio.get_running_loop()), photos_root, recursive=True,
+        )
+        self._observer.start()
+
+    def stop_watching(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+
+    def stats(self):
+        return {
+            'size': len(self._manifests),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+        }
+
+
+class InvalidatingEventHandler(FileSystemEventHandler):
+    def __init__(self, cache, photos_root, loop):
+        super().__init__()
+        self.cache = cache
+        self.photos_root = photos_root
+        self.loop = loop
+
+    def invalidate_paths(self, event):
+        # Events come from the observer thread, the cache lives in the event loop
+        for path in (event.src_path, getattr(event, 'dest_path', '')):
+            relative_path = os.path.relpath(path, self.photos_root) if path else os.pardir
+            if relative_path.startswith(os.pardir):
+                continue
+            archive_hash = relative_path.split(os.sep)[0]
+            photos_dir = os.path.join(self.photos_root, archive_hash)
+            self.loop.call_soon_threadsafe(self.cache.invalidate, photos_dir)
+
+    # Opening and closing of photos by downloads are reported too, only changes drop manifests
+    on_created = on_deleted = on_modified = on_moved = invalidate_paths
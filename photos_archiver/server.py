@@ -1,20 +1,79 @@
 import asyncio
 import logging
 import os
-import sys
 
 from aiohttp import web
 import aiofiles
 
+from manifest_cache import ManifestCache
+from shaper import BandwidthShaper
+from zipstream import FileSlice
+
 CHUNK_SIZE = 102400
 SHOW_LOGS = os.getenv('SHOW_LOGS', False)
 PHOTOS_DIR = os.getenv('PHOTOS_DIR', 'test_photos')
-PAUSE_TIME = os.getenv('PAUSE_TIME', 1)
+# Bytes per second, 0 is unlimited
+DOWNLOAD_RATE = int(os.getenv('DOWNLOAD_RATE', 0))
+ARCHIVE_RATE = int(os.getenv('ARCHIVE_RATE', 0))
+EGRESS_RATE = int(os.getenv('EGRESS_RATE', 0))
+BURST_TIME = float(os.getenv('BURST_TIME', 1))
+NO_SENDFILE = os.getenv('NO_SENDFILE', False)
+MANIFEST_CACHE_SIZE = int(os.getenv('MANIFEST_CACHE_SIZE', 1000))
+MANIFEST_CACHE_DIR = os.getenv('MANIFEST_CACHE_DIR', 'manifests')
+MANIFEST_RECHECK_INTERVAL = float(os.getenv('MANIFEST_RECHECK_INTERVAL', 300))
 
 if SHOW_LOGS:
     logging.basicConfig(level=logging.DEBUG)
 
 
+def get_requested_range(request, layout):
+    """Return [start, end) of the archive to send, None for the whole archive."""
+    if_range = request.headers.get('If-Range')
+    if if_range is not None and if_range != layout.etag:
+        # The archive changed since the first part was downloaded
+        return None
+    try:
+        requested_range = request.http_range
+    except ValueError:
+        # Malformed and multi-part ranges are ignored, as RFC 7233 allows
+        return None
+    start, end = requested_range.start, requested_range.stop
+    if start is None and end is None:
+        return None
+    if start is None:
+        start = 0
+    elif start < 0:
+        # Suffix range, the last -start bytes
+        start = max(layout.size + start, 0)
+    end = layout.size if end is None else min(end, layout.size)
+    if start >= end:
+        raise web.HTTPRequestRangeNotSatisfiable(headers={'Content-Range': f'bytes */{layout.size}'})
+    return start, end
+
+
+async def send_file_slice(request, file_slice, download, chunk_size):
+    """Send a part of a member file straight from the page cache to the socket, by pieces of chunk_size.
+
+    The file is opened once for the whole slice, each piece waits for its turn in the shaper.
+    """
+    loop = asyncio.get_running_loop()
+    transport = request.transport
+    if transport is None:
+        raise ConnectionResetError('Connection lost')
+    member_file = await loop.run_in_executor(None, open, file_slice.path, 'rb')
+    try:
+        for start in range(file_slice.start, file_slice.end, chunk_size):
+            count = min(chunk_size, file_slice.end - start)
+            await download.throttle(count)
+            logging.info(f'Sending archive chunk {count} with sendfile ...')
+            # Falls back to reading the file in Python where sendfile is unavailable, e.g. over TLS
+            sent = await loop.sendfile(transport, member_file, start, count)
+            if sent != count:
+                raise RuntimeError(f'{file_slice.path} was truncated while archiving')
+    finally:
+        member_file.close()
+
+
 async def archivate(request):
     archive_hash = request.match_info['archive_hash']
 
@@ -23,40 +82,60 @@ async def archivate(request):
     if not os.path.exists(photos_dir):
         raise web.HTTPFound('/404/')
 
+    # The archive is packed right here, chunk by chunk, no zip process is spawned
+    manifest_cache = request.app['manifest_cache']
+    layout = await manifest_cache.get_layout(photos_dir)
+
     headers = {
         'Content-Type': 'application/zip',
         'Content-Disposition': f'attachment; filename="{archive_hash}".zip',
+        'Accept-Ranges': 'bytes',
+        'ETag': layout.etag,
     }
-
-    response = web.StreamResponse(headers=headers)
+    requested_range = get_requested_range(request, layout)
+    if requested_range is None:
+        start, end = 0, layout.size
+        response = web.StreamResponse(headers=headers)
+    else:
+        start, end = requested_range
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{layout.size}'
+        response = web.StreamResponse(status=206, headers=headers)
+    response.content_length = end - start
     await response.prepare(request)
+    if request.method == 'HEAD':
+        return response
 
-    zip_command = ['zip', '-r', '-', photos_dir]
-
-    process = await asyncio.create_subprocess_exec(
-        sys.executable,
-        *zip_command,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
+    shaper = request.app['shaper']
     try:
-        while True:
-            data = await process.stdout.read(CHUNK_SIZE)
-            if not data:
-                logging.info('Complited to send the file.')
-                break
-            logging.info(f'Sending archive chunk {len(data)} ...')
-            await response.write(data)
-            await asyncio.sleep(PAUSE_TIME)
+        with shaper.open(archive_hash) as download:
+            # In STORE mode member data are the file bytes as is, so they go by sendfile and only headers by write
+            async for data in layout.stream(start, end, CHUNK_SIZE, file_slices=not NO_SENDFILE):
+                if not isinstance(data, FileSlice):
+                    await download.throttle(len(data))
+                    logging.info(f'Sending archive chunk {len(data)} ...')
+                    # write waits while the client is slow, so only one chunk per download is kept in memory
+                    await response.write(data)
+                    continue
+                # A shaped download takes its turn by chunks, otherwise a file goes with a single sendfile
+                chunk_size = CHUNK_SIZE if shaper.enabled else data.end - data.start
+                await send_file_slice(request, data, download, chunk_size)
     except asyncio.CancelledError:
         logging.error('Download was interrupted.')
-        logging.info(f'Killing the zip subprocess.')
-        process.kill()
-    finally:
-        await response.write_eof()
+        raise
+    logging.info('Complited to send the file.')
+    await response.write_eof()
+    # CRCs of the members are known now, the next download sends them without reading the files twice
+    await manifest_cache.save(photos_dir)
     return response
 
 
+async def handle_stats(request):
+    return web.json_response({
+        'bandwidth': request.app['shaper'].stats(),
+        'manifest_cache': request.app['manifest_cache'].stats(),
+    })
+
+
 async def handle_index_page(request):
     async with aiofiles.open('templates/index.html', mode='r') as index_file:
         index_contents = await index_file.read()
@@ -69,11 +148,30 @@ async def handle_404_page(request):
     return web.Response(text=index_contents, content_type='text/html')
 
 
-if __name__ == '__main__':
+async def start_manifest_cache(app):
+    app['manifest_cache'].start_watching('photos')
+
+
+async def stop_manifest_cache(app):
+    app['manifest_cache'].stop_watching()
+
+
+def create_app():
     app = web.Application()
+    app['manifest_cache'] = ManifestCache(
+        MANIFEST_CACHE_SIZE, MANIFEST_CACHE_DIR or None, MANIFEST_RECHECK_INTERVAL,
+    )
+    app['shaper'] = BandwidthShaper(DOWNLOAD_RATE, ARCHIVE_RATE, EGRESS_RATE, BURST_TIME)
+    app.on_startup.append(start_manifest_cache)
+    app.on_cleanup.append(stop_manifest_cache)
     app.add_routes([
         web.get('/', handle_index_page),
         web.get('/archive/{archive_hash}/', archivate),
         web.get('/404/', handle_404_page),
+        web.get('/stats/', handle_stats),
     ])
-    web.run_app(app)
+    return app
+
+
+if __name__ == '__main__':
+    web.run_app(create_app())
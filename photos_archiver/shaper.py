@@ -0,0 +1,113 @@
+"""Bandwidth shaping of downloads with token buckets.
+
+Every download may be limited by three buckets: its own, one shared by all
+downloads of the same archive, and the global egress one. A bucket hands out
+bytes at its rate and lets a burst of burst_time seconds through at once.
+
+Tokens are reserved in advance and may go below zero, the download then
+sleeps until the debt is paid. Downloads take chunks of the same size one
+after another, so reservations in a shared bucket come in turn from every
+active download, and each gets an equal share of its rate.
+"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, burst_time=1.0, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = rate * burst_time
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated_at = clock()
+
+    def reserve(self, size):
+        """Take size bytes, return seconds to wait before sending them."""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= size
+        return max(-self.tokens / self.rate, 0)
+
+
+class BandwidthShaper:
+    """Rates are in bytes per second, 0 leaves the download, archive or egress unlimited."""
+
+    def __init__(self, download_rate=0, archive_rate=0, egress_rate=0, burst_time=1.0):
+        self.download_rate = download_rate
+        self.archive_rate = archive_rate
+        self.egress_rate = egress_rate
+        self.burst_time = burst_time
+        self.egress_bucket = TokenBucket(egress_rate, burst_time) if egress_rate else None
+        # Archive hash -> [bucket, active downloads], dropped with the last download of the archive
+        self._archive_buckets = {}
+        self.active_downloads = 0
+        self.sent_bytes = 0
+        self.throttled_seconds = 0.0
+
+    @property
+    def enabled(self):
+        return bool(self.download_rate or self.archive_rate or self.egress_rate)
+
+    def open(self, archive_hash):
+        return Download(self, archive_hash)
+
+    def _acquire_archive_bucket(self, archive_hash):
+        if not self.archive_rate:
+            return None
+        if archive_hash not in self._archive_buckets:
+            self._archive_buckets[archive_hash] = [TokenBucket(self.archive_rate, self.burst_time), 0]
+        self._archive_buckets[archive_hash][1] += 1
+        return self._archive_buckets[archive_hash][0]
+
+    def _release_archive_bucket(self, archive_hash):
+        if archive_hash not in self._archive_buckets:
+            return
+        self._archive_buckets[archive_hash][1] -= 1
+        if not self._archive_buckets[archive_hash][1]:
+            del self._archive_buckets[archive_hash]
+
+    def stats(self):
+        return {
+            'download_rate': self.download_rate,
+            'archive_rate': self.archive_rate,
+            'egress_rate': self.egress_rate,
+            'active_downloads': self.active_downloads,
+            'active_archives': len(self._archive_buckets),
+            'sent_bytes': self.sent_bytes,
+            'throttled_seconds': round(self.throttled_seconds, 3),
+        }
+
+
+class Download:
+    def __init__(self, shaper, archive_hash):
+        self.shaper = shaper
+        self.archive_hash = archive_hash
+        self.bucket = None
+        self.archive_bucket = None
+
+    def __enter__(self):
+        shaper = self.shaper
+        shaper.active_downloads += 1
+        if shaper.download_rate:
+            self.bucket = TokenBucket(shaper.download_rate, shaper.burst_time)
+        self.archive_bucket = shaper._acquire_archive_bucket(self.archive_hash)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shaper.active_downloads -= 1
+        self.shaper._release_archive_bucket(self.archive_hash)
+
+    async def _wait(self, delay):
+        if delay:
+            self.shaper.throttled_seconds += delay
+            await asyncio.sleep(delay)
+
+    async def throttle(self, size):
+        """Wait until size bytes may be sent."""
+        self.shaper.sent_bytes += size
+        own_buckets = [bucket for bucket in (self.bucket, self.archive_bucket) if bucket is not None]
+        await self._wait(max([bucket.reserve(size) for bucket in own_buckets], default=0))
+        # Egress is reserved last, so that it is not booked by downloads held back by their own limits
+        if self.shaper.egress_bucket is not None:
+            await self._wait(self.shaper.egress_bucket.reserve(size))
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from manifest_cache import ManifestCache
+from test_zipstream import read_zip
+
+
+@pytest.mark.asyncio
+async def test_manifest_cache_reuses_crcs(tmp_path):
+    photos_dir = str(tmp_path / 'photos' / 'hash')
+    os.makedirs(photos_dir)
+    with open(os.path.join(photos_dir, '1.jpg'), 'wb') as photo:
+        photo.write(os.urandom(1000))
+    cache = ManifestCache(sidecar_dir=str(tmp_path / 'manifests'))
+
+    layout = await cache.get_layout(photos_dir)
+    archive = await read_zip(layout)
+    await cache.save(photos_dir)
+
+    assert await cache.get_layout(photos_dir) is layout
+    assert cache.stats()['hits'] == 1
+
+    restarted_cache = ManifestCache(sidecar_dir=str(tmp_path / 'manifests'))
+    restored_layout = await restarted_cache.get_layout(photos_dir)
+    assert restored_layout.crcs == {0: layout.crcs[0]}
+    assert restarted_cache.stats()['misses'] == 0
+    assert await read_zip(restored_layout, start=len(archive) - 100) == archive[-100:]
+
+
+@pytest.mark.asyncio
+async def test_manifest_cache_rescans_changed_directory(tmp_path):
+    photos_dir = str(tmp_path / 'hash')
+    os.makedirs(photos_dir)
+    with open(os.path.join(photos_dir, '1.jpg'), 'wb') as photo:
+        photo.write(b'first')
+    cache = ManifestCache()
+    layout = await cache.get_layout(photos_dir)
+    await read_zip(layout)
+
+    with open(os.path.join(photos_dir, '2.jpg'), 'wb') as photo:
+        photo.write(b'second')
+    # Directory mtimes may be too coarse to see a change made in the same instant
+    os.utime(photos_dir, (time.time() + 10, time.time() + 10))
+
+    new_layout = await cache.get_layout(photos_dir)
+    assert [member.name for member in new_layout.members] == [
+        os.path.join(photos_dir, '1.jpg'), os.path.join(photos_dir, '2.jpg'),
+    ]
+    assert new_layout.crcs == {0: layout.crcs[0]}
+
+    cache.invalidate(photos_dir)
+    assert len(cache) == 0
+
+
+async def wait_for_events():
+    # The observer thread reports events with a delay, then they are handed to the loop
+    await asyncio.sleep(0.5)
+
+
+@pytest.mark.asyncio
+async def test_watched_manifest_survives_reads(tmp_path):
+    pytest.importorskip('watchdog')
+    photos_root = str(tmp_path / 'photos')
+    photos_dir = os.path.join(photos_root, 'hash')
+    os.makedirs(photos_dir)
+    photo_path = os.path.join(photos_dir, '1.jpg')
+    with open(photo_path, 'wb') as photo:
+        photo.write(os.urandom(1000))
+    cache = ManifestCache(sidecar_dir=str(tmp_path / 'manifests'))
+    cache.start_watching(photos_root)
+    try:
+        await wait_for_events()
+        layout = await cache.get_layout(photos_dir)
+        await read_zip(layout, file_slices=True)
+        await cache.save(photos_dir)
+        await wait_for_events()
+
+        assert await cache.get_layout(photos_dir) is layout
+        assert cache.stats()['invalidations'] == 0
+        assert os.path.exists(cache._get_sidecar_path(photos_dir))
+
+        with open(photo_path, 'ab') as photo:
+            photo.write(b'more')
+        await wait_for_events()
+        assert cache.stats()['invalidations'] == 1
+    finally:
+        cache.stop_watching()
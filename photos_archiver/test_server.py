@@ -0,0 +1,141 @@
+import io
+import os
+import zipfile
+
+from aiohttp.test_utils import TestClient, TestServer
+import pytest
+
+import server
+
+ARCHIVE_URL = '/archive/hash/'
+
+
+@pytest.fixture
+def photos_dir(tmp_path, monkeypatch):
+    # The server finds photos and manifests relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    photos_dir = tmp_path / 'photos' / 'hash'
+    (photos_dir / 'album').mkdir(parents=True)
+    (photos_dir / '1.jpg').write_bytes(os.urandom(300_000))
+    (photos_dir / 'album' / '2.jpg').write_bytes(os.urandom(1000))
+    (photos_dir / '3.jpg').write_bytes(b'')
+    return photos_dir
+
+
+async def download(path=ARCHIVE_URL, method='GET', headers=None):
+    async with TestClient(TestServer(server.create_app())) as client:
+        response = await client.request(method, path, headers=headers, allow_redirects=False)
+        return response, await response.read()
+
+
+def check_archive(archive):
+    with zipfile.ZipFile(io.BytesIO(archive)) as zip_file:
+        assert zip_file.testzip() is None
+        assert len(zip_file.infolist()) == 3
+        for info in zip_file.infolist():
+            # Member names are the photo paths relative to the working directory
+            with open(info.filename, 'rb') as photo:
+                assert zip_file.read(info) == photo.read()
+
+
+@pytest.mark.asyncio
+async def test_archive_download(photos_dir):
+    response, archive = await download()
+
+    assert response.status == 200
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert int(response.headers['Content-Length']) == len(archive)
+    check_archive(archive)
+
+
+@pytest.mark.asyncio
+async def test_archive_head(photos_dir):
+    _, archive = await download()
+
+    response, body = await download(method='HEAD')
+
+    assert response.status == 200
+    assert int(response.headers['Content-Length']) == len(archive)
+    assert body == b''
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('requested_range, start, end', [
+    ('bytes=10-99', 10, 100),
+    ('bytes=300000-', 300000, None),
+    ('bytes=-100', -100, None),
+])
+async def test_archive_range(photos_dir, requested_range, start, end):
+    _, archive = await download()
+    expected_part = archive[start:end]
+    first_byte = start % len(archive)
+
+    response, part = await download(headers={'Range': requested_range})
+
+    assert response.status == 206
+    assert response.headers['Content-Range'] == f'bytes {first_byte}-{first_byte + len(expected_part) - 1}/{len(archive)}'
+    assert int(response.headers['Content-Length']) == len(part)
+    assert part == expected_part
+
+
+@pytest.mark.asyncio
+async def test_archive_range_not_satisfiable(photos_dir):
+    _, archive = await download()
+
+    response, _ = await download(headers={'Range': f'bytes={len(archive)}-'})
+
+    assert response.status == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(archive)}'
+
+
+@pytest.mark.asyncio
+async def test_archive_if_range(photos_dir):
+    response, archive = await download()
+    etag = response.headers['ETag']
+
+    response, part = await download(headers={'Range': 'bytes=100-', 'If-Range': etag})
+    assert response.status == 206
+    assert part == archive[100:]
+
+    # The archive changed since the first part, so it is sent again as a whole
+    response, body = await download(headers={'Range': 'bytes=100-', 'If-Range': '"outdated"'})
+    assert response.status == 200
+    assert int(response.headers['Content-Length']) == len(body)
+    assert body == archive
+
+
+@pytest.mark.asyncio
+async def test_missing_archive(photos_dir):
+    response, _ = await download('/archive/missing/')
+
+    assert response.status == 302
+    assert response.headers['Location'] == '/404/'
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('download_rate', [0, 100 * 2 ** 20])
+async def test_archive_sendfile_matches_fallback(photos_dir, monkeypatch, download_rate):
+    # A shaped download sends files by sendfile in chunks
+    monkeypatch.setattr(server, 'DOWNLOAD_RATE', download_rate)
+    sent_slices = []
+    send_file_slice = server.send_file_slice
+
+    async def count_file_slices(request, file_slice, download, chunk_size):
+        sent_slices.append(file_slice)
+        await send_file_slice(request, file_slice, download, chunk_size)
+
+    monkeypatch.setattr(server, 'send_file_slice', count_file_slices)
+    monkeypatch.setattr(server, 'NO_SENDFILE', '1')
+    _, fallback_archive = await download()
+    _, fallback_part = await download(headers={'Range': 'bytes=1000-200000'})
+    assert sent_slices == []
+
+    monkeypatch.setattr(server, 'NO_SENDFILE', False)
+    response, archive = await download()
+    _, part = await download(headers={'Range': 'bytes=1000-200000'})
+
+    assert len(sent_slices) > 2
+    assert int(response.headers['Content-Length']) == len(archive)
+    assert archive == fallback_archive
+    assert part == fallback_part == archive[1000:200001]
+    check_archive(archive)
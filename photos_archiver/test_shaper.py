@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from shaper import BandwidthShaper, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_lets_burst_through_and_then_keeps_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1000, burst_time=0.5, clock=clock)
+
+    assert bucket.reserve(500) == 0
+    assert bucket.reserve(250) == 0.25
+    clock.now = 1.0
+    # Tokens do not pile up above the burst while the download is idle
+    assert bucket.reserve(750) == 0.25
+
+
+@pytest.mark.asyncio
+async def test_egress_is_shared_fairly_between_downloads():
+    shaper = BandwidthShaper(egress_rate=100_000, burst_time=0.001)
+    sent = {'a': 0, 'b': 0}
+
+    async def download(archive_hash):
+        with shaper.open(archive_hash) as archive_download:
+            while True:
+                await archive_download.throttle(1000)
+                sent[archive_hash] += 1000
+
+    tasks = [asyncio.ensure_future(download(archive_hash)) for archive_hash in sent]
+    await asyncio.sleep(0.2)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert abs(sent['a'] - sent['b']) <= 1000
+    assert sent['a'] + sent['b'] <= 100_000 * 0.2 + 3000
+    assert shaper.stats()['active_downloads'] == 0
+
+
+def test_archive_limit_is_shared_by_its_downloads():
+    shaper = BandwidthShaper(archive_rate=1000)
+
+    with shaper.open('hash') as first_download, shaper.open('hash') as second_download:
+        with shaper.open('other') as other_download:
+            assert first_download.archive_bucket is second_download.archive_bucket
+            assert other_download.archive_bucket is not first_download.archive_bucket
+            assert first_download.bucket is None
+            assert shaper.stats()['active_archives'] == 2
+        assert shaper.stats()['active_archives'] == 1
+    assert shaper.stats()['active_archives'] == 0
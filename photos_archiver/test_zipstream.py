@@ -0,0 +1,65 @@
+import io
+import os
+import struct
+import zipfile
+
+import pytest
+
+from zipstream import (
+    CHUNK_SIZE, END_OF_CENTRAL_DIRECTORY, ZIP64_END_LOCATOR, ZIP64_END_OF_CENTRAL_DIRECTORY,
+    ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE, ArchiveLayout, FileSlice, build_end_of_central_directory,
+    scan_members,
+)
+
+
+async def read_zip(layout, start=0, end=None, chunk_size=CHUNK_SIZE, file_slices=False):
+    parts = []
+    async for part in layout.stream(start, end, chunk_size, file_slices):
+        if isinstance(part, FileSlice):
+            with open(part.path, 'rb') as member_file:
+                member_file.seek(part.start)
+                part = member_file.read(part.end - part.start)
+        parts.append(part)
+    return b''.join(parts)
+
+
+@pytest.mark.asyncio
+async def test_stream_zip_is_readable(tmp_path):
+    archive_dir = tmp_path / 'photos' / 'hash'
+    (archive_dir / 'album').mkdir(parents=True)
+    (archive_dir / '1.jpg').write_bytes(os.urandom(250_000))
+    (archive_dir / 'album' / '2.jpg').write_bytes(b'')
+    (archive_dir / 'фото.jpg').write_bytes(b'photo')
+    members = scan_members(str(archive_dir))
+
+    layout = ArchiveLayout(members)
+    archive = await read_zip(layout, chunk_size=1000)
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as zip_file:
+        assert zip_file.testzip() is None
+        assert [info.filename for info in zip_file.infolist()] == [member.name for member in members]
+        assert zip_file.read(members[0].name) == (archive_dir / '1.jpg').read_bytes()
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in zip_file.infolist())
+    assert len(archive) == layout.size
+
+
+@pytest.mark.asyncio
+async def test_archive_ranges(tmp_path):
+    (tmp_path / '1.jpg').write_bytes(os.urandom(5000))
+    (tmp_path / '2.jpg').write_bytes(os.urandom(3000))
+    members = scan_members(str(tmp_path))
+    archive = await read_zip(ArchiveLayout(members))
+
+    for start, end in [(0, 10), (40, 5100), (5050, 5200), (4000, 8500), (8000, len(archive)), (0, len(archive))]:
+        # A fresh layout knows no CRC, like the one built for a resumed download
+        assert await read_zip(ArchiveLayout(members), start, end, chunk_size=700) == archive[start:end]
+        assert await read_zip(ArchiveLayout(members), start, end, file_slices=True) == archive[start:end]
+
+
+def test_end_of_central_directory_switches_to_zip64():
+    record = build_end_of_central_directory(70_000, 100, 5 * 2 ** 30)
+
+    assert record[:4] == struct.pack('<I', ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE)
+    assert len(record) == (
+        ZIP64_END_OF_CENTRAL_DIRECTORY.size + ZIP64_END_LOCATOR.size + END_OF_CENTRAL_DIRECTORY.size
+    )
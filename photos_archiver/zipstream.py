@@ -0,0 +1,274 @@
+"""Streaming ZIP writer for archives that are never stored on disk.
+
+Members are written in STORE mode: photos are already compressed, so deflate
+would only burn CPU. The CRC of a member is known only after its data is
+read, so it goes to a data descriptor after the data, and the central
+directory at the end repeats it. Files are read in chunks, so a download
+holds at most one chunk in memory whatever the archive size is.
+"""
+import binascii
+from collections import namedtuple
+import hashlib
+import os
+import struct
+import time
+
+import aiofiles
+
+CHUNK_SIZE = 102400
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+DATA_DESCRIPTOR = struct.Struct('<IIII')
+ZIP64_DATA_DESCRIPTOR = struct.Struct('<IIQQ')
+CENTRAL_DIRECTORY_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+END_OF_CENTRAL_DIRECTORY = struct.Struct('<IHHHHIIH')
+ZIP64_END_OF_CENTRAL_DIRECTORY = struct.Struct('<IQHHIIQQQQ')
+ZIP64_END_LOCATOR = struct.Struct('<IIQI')
+EXTRA_HEADER = struct.Struct('<HH')
+
+LOCAL_HEADER_SIGNATURE = 0x04034b50
+DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+CENTRAL_DIRECTORY_SIGNATURE = 0x02014b50
+END_OF_CENTRAL_DIRECTORY_SIGNATURE = 0x06054b50
+ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE = 0x06064b50
+ZIP64_END_LOCATOR_SIGNATURE = 0x07064b50
+ZIP64_EXTRA_ID = 0x0001
+
+# Bit 3: CRC is in the data descriptor, bit 11: names are UTF-8
+FLAGS = 0x0808
+STORED = 0
+VERSION = 20
+ZIP64_VERSION = 45
+# Made by Unix, so that the external attributes keep file permissions
+MADE_BY_UNIX = 3 << 8
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP32_ENTRIES_LIMIT = 0xFFFF
+
+ZipMember = namedtuple('ZipMember', ['path', 'name', 'size', 'mtime', 'mode'])
+# Bytes [start, end) of a member file, to be sent by the caller with sendfile
+FileSlice = namedtuple('FileSlice', ['path', 'start', 'end'])
+
+
+def scan_members(directory, dir_mtimes=None):
+    """Return files of the directory as archive members, in a stable order.
+
+    mtimes of the directory and its subdirectories are put into dir_mtimes, if it is given.
+    """
+    members = []
+    for root, dirs, files in os.walk(directory):
+        if dir_mtimes is not None:
+            dir_mtimes[root] = os.stat(root).st_mtime
+        dirs.sort()
+        for file_name in sorted(files):
+            path = os.path.join(root, file_name)
+            stat = os.stat(path)
+            members.append(ZipMember(path, path, stat.st_size, stat.st_mtime, stat.st_mode))
+    return members
+
+
+def get_dos_datetime(mtime):
+    moment = time.localtime(mtime)
+    if moment.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (moment.tm_hour << 11) | (moment.tm_min << 5) | (moment.tm_sec // 2)
+    dos_date = ((moment.tm_year - 1980) << 9) | (moment.tm_mon << 5) | moment.tm_mday
+    return dos_time, dos_date
+
+
+def is_zip64_member(member):
+    return member.size >= ZIP32_LIMIT
+
+
+def build_local_header(member):
+    name = member.name.encode()
+    dos_time, dos_date = get_dos_datetime(member.mtime)
+    if is_zip64_member(member):
+        version = ZIP64_VERSION
+        size = ZIP32_LIMIT
+        extra = EXTRA_HEADER.pack(ZIP64_EXTRA_ID, 16) + struct.pack('<QQ', member.size, member.size)
+    else:
+        version = VERSION
+        size = member.size
+        extra = b''
+    # Sizes are known in advance and kept in the header for readers that do not look at the descriptor
+    header = LOCAL_HEADER.pack(
+        LOCAL_HEADER_SIGNATURE, version, FLAGS, STORED, dos_time, dos_date,
+        0, size, size, len(name), len(extra),
+    )
+    return header + name + extra
+
+
+def build_data_descriptor(member, crc):
+    if is_zip64_member(member):
+        return ZIP64_DATA_DESCRIPTOR.pack(DATA_DESCRIPTOR_SIGNATURE, crc, member.size, member.size)
+    return DATA_DESCRIPTOR.pack(DATA_DESCRIPTOR_SIGNATURE, crc, member.size, member.size)
+
+
+def build_central_directory_header(member, crc, offset):
+    name = member.name.encode()
+    dos_time, dos_date = get_dos_datetime(member.mtime)
+    zip64_fields = []
+    size = member.size
+    if is_zip64_member(member):
+        zip64_fields.extend([member.size, member.size])
+        size = ZIP32_LIMIT
+    if offset >= ZIP32_LIMIT:
+        zip64_fields.append(offset)
+        offset = ZIP32_LIMIT
+    extra = b''
+    if zip64_fields:
+        extra = EXTRA_HEADER.pack(ZIP64_EXTRA_ID, 8 * len(zip64_fields))
+        extra += struct.pack(f'<{len(zip64_fields)}Q', *zip64_fields)
+    version = ZIP64_VERSION if zip64_fields else VERSION
+    header = CENTRAL_DIRECTORY_HEADER.pack(
+        CENTRAL_DIRECTORY_SIGNATURE, MADE_BY_UNIX | ZIP64_VERSION, version, FLAGS, STORED,
+        dos_time, dos_date, crc, size, size, len(name), len(extra), 0, 0, 0,
+        (member.mode & 0xFFFF) << 16, offset,
+    )
+    return header + name + extra
+
+
+def build_end_of_central_directory(entries_count, directory_size, directory_offset):
+    record = b''
+    if (entries_count >= ZIP32_ENTRIES_LIMIT
+            or directory_size >= ZIP32_LIMIT
+            or directory_offset >= ZIP32_LIMIT):
+        zip64_end_offset = directory_offset + directory_size
+        record += ZIP64_END_OF_CENTRAL_DIRECTORY.pack(
+            ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE, ZIP64_END_OF_CENTRAL_DIRECTORY.size - 12,
+            MADE_BY_UNIX | ZIP64_VERSION, ZIP64_VERSION, 0, 0,
+            entries_count, entries_count, directory_size, directory_offset,
+        )
+        record += ZIP64_END_LOCATOR.pack(ZIP64_END_LOCATOR_SIGNATURE, 0, zip64_end_offset, 1)
+        entries_count = min(entries_count, ZIP32_ENTRIES_LIMIT)
+        directory_size = min(directory_size, ZIP32_LIMIT)
+        directory_offset = min(directory_offset, ZIP32_LIMIT)
+    record += END_OF_CENTRAL_DIRECTORY.pack(
+        END_OF_CENTRAL_DIRECTORY_SIGNATURE, 0, 0,
+        entries_count, entries_count, directory_size, directory_offset, 0,
+    )
+    return record
+
+
+def clip(data, offset, start, end):
+    """Return the part of data lying at offset in the archive that falls into [start, end)."""
+    return data[max(start - offset, 0):max(end - offset, 0)]
+
+
+async def compute_crc(path, size, chunk_size=CHUNK_SIZE):
+    crc = 0
+    async for chunk in read_file(path, 0, size, chunk_size):
+        crc = binascii.crc32(chunk, crc)
+    return crc
+
+
+async def read_file(path, start, end, chunk_size=CHUNK_SIZE):
+    async with aiofiles.open(path, mode='rb') as member_file:
+        await member_file.seek(start)
+        # Exactly the size from the layout is sent, even if the file grows meanwhile
+        left = end - start
+        while left:
+            chunk = await member_file.read(min(chunk_size, left))
+            if not chunk:
+                raise RuntimeError(f'{path} was truncated while archiving')
+            left -= len(chunk)
+            yield chunk
+
+
+class ArchiveLayout:
+    """Byte layout of the archive, computed from file sizes and mtimes alone.
+
+    Local headers do not depend on the CRC, so the size of the archive and
+    the offset of every member are known before any file is read. That gives
+    an exact Content-Length and lets a Range request start anywhere: the
+    files before the range are only read if their CRC is needed, for a data
+    descriptor or the central directory inside the range.
+    """
+
+    def __init__(self, members, crcs=None):
+        self.members = members
+        self.local_headers = [build_local_header(member) for member in members]
+        # Member index -> CRC, filled as members are read
+        self.crcs = dict(crcs or {})
+        self.offsets = []
+        offset = 0
+        for member, local_header in zip(members, self.local_headers):
+            self.offsets.append(offset)
+            offset += len(local_header) + member.size + len(build_data_descriptor(member, 0))
+        self.directory_offset = offset
+        self.directory_size = sum(
+            len(build_central_directory_header(member, 0, member_offset))
+            for member, member_offset in zip(members, self.offsets)
+        )
+        end_record = build_end_of_central_directory(len(members), self.directory_size, self.directory_offset)
+        self.size = self.directory_offset + self.directory_size + len(end_record)
+
+    @property
+    def etag(self):
+        """Changes whenever a file is added, removed or modified, so a resumed download never mixes versions."""
+        manifest = '\n'.join(f'{member.name}:{member.size}:{member.mtime}' for member in self.members)
+        return '"{}"'.format(hashlib.md5(manifest.encode()).hexdigest())
+
+    async def get_crc(self, index, chunk_size=CHUNK_SIZE):
+        if index not in self.crcs:
+            member = self.members[index]
+            self.crcs[index] = await compute_crc(member.path, member.size, chunk_size)
+        return self.crcs[index]
+
+    async def _stream_member(self, index, start, end, chunk_size, file_slices):
+        member = self.members[index]
+        local_header = self.local_headers[index]
+        data_offset = self.offsets[index] + len(local_header)
+        descriptor_offset = data_offset + member.size
+
+        header_part = clip(local_header, self.offsets[index], start, end)
+        if header_part:
+            yield header_part
+
+        data_start = min(max(start - data_offset, 0), member.size)
+        data_end = min(max(end - data_offset, 0), member.size)
+        whole_data = data_start == 0 and data_end == member.size
+        crc = 0
+        if data_start < data_end and file_slices:
+            # The CRC is read later, from the page cache, if no earlier download has computed it
+            yield FileSlice(member.path, data_start, data_end)
+        elif data_start < data_end:
+            async for chunk in read_file(member.path, data_start, data_end, chunk_size):
+                if whole_data:
+                    crc = binascii.crc32(chunk, crc)
+                yield chunk
+            if whole_data:
+                self.crcs[index] = crc
+
+        if end > descriptor_offset:
+            data_descriptor = build_data_descriptor(member, await self.get_crc(index, chunk_size))
+            descriptor_part = clip(data_descriptor, descriptor_offset, start, end)
+            if descriptor_part:
+                yield descriptor_part
+
+    async def stream(self, start=0, end=None, chunk_size=CHUNK_SIZE, file_slices=False):
+        """Yield bytes [start, end) of the archive chunk by chunk.
+
+        With file_slices, data of the members is yielded as FileSlice instead of bytes,
+        and only the headers are built in Python.
+        """
+        end = self.size if end is None else end
+        for index, member_offset in enumerate(self.offsets):
+            next_offset = self.offsets[index + 1] if index + 1 < len(self.offsets) else self.directory_offset
+            if member_offset >= end:
+                return
+            if next_offset > start:
+                async for chunk in self._stream_member(index, start, end, chunk_size, file_slices):
+                    yield chunk
+
+        if end > self.directory_offset:
+            directory = []
+            for index, (member, member_offset) in enumerate(zip(self.members, self.offsets)):
+                crc = await self.get_crc(index, chunk_size)
+                directory.append(build_central_directory_header(member, crc, member_offset))
+            directory.append(
+                build_end_of_central_directory(len(self.members), self.directory_size, self.directory_offset)
+            )
+            directory_part = clip(b''.join(directory), self.directory_offset, start, end)
+            if directory_part:
+                yield directory_part